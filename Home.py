@@ -1,10 +1,15 @@
 import streamlit as st
 
+from utils.profiling import finish_rerun, sidebar_panel, start_rerun
+
 # Page config (adds tab title, icon, layout)
 st.set_page_config(
     page_title="Climate Change Dashboard - Nepal", page_icon="🌦️", layout="wide"
 )
 
+start_rerun("Home")
+sidebar_panel()
+
 # Main title
 st.title("🌦️ Climate Change Impact Dashboard – Nepal ")
 
@@ -40,3 +45,5 @@ st.write("---")
 st.write(
     "🚀 Built by Sashank Niraula | 📬 Contact: haudedai@proton.me | 🧑‍🔬 For academic and policy use"
 )
+
+finish_rerun()
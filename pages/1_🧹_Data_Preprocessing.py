@@ -1,8 +1,25 @@
 import streamlit as st
 
-from utils.data_loader import load_geospatial_data, load_tabular_data
-from utils.figures import display_shape_file
-from utils.data_preprocessing import get_column_info, melt_dataframe, get_shape
+from utils.data_loader import (
+    SHAPEFILE_PATHS,
+    SHEET_DATASETS,
+    TABULAR_DATASETS,
+    load_dataset,
+    load_sheet,
+)
+from utils.dtypes import DTYPE_OPTIONS
+from utils.geometry import LOD_PIXELS
+from utils.data_preprocessing import (
+    get_column_info,
+    get_missing_value_strategies,
+    get_shape,
+)
+from utils.pipeline import Pipeline
+from utils.reshape import VARIABLE_TYPES
+from utils.profiling import finish_rerun, sidebar_panel, stage, start_rerun, stop
+from utils.schema import SCHEMAS, memory_report
+from utils.spatial import admin_levels
+from utils.webmap import map_figure
 
 st.set_page_config(
     page_title="Climate Change Dashboard - Data Preprocessing",
@@ -10,71 +27,92 @@ st.set_page_config(
     layout="wide",
 )
 
-geo_data, shapefile_paths = load_geospatial_data()
-tabular_data = load_tabular_data()
-
-data_options = {**geo_data, **tabular_data}
+# Timings of this rerun, shown in the sidebar on the next one
+start_rerun("Data Preprocessing")
+sidebar_panel()
 
 st.title("Data Preprocessing")
 
 # --- Initialize session state ---
-if "report_df" not in st.session_state:
-    st.session_state.report_df = None
-if "monthly_df" not in st.session_state:
-    st.session_state.monthly_df = None
-
-if "dtypes_df" not in st.session_state:
-    st.session_state.dtypes_df = None
-if "missing_df" not in st.session_state:
-    st.session_state.missing_df = None
+# One pipeline of preprocessing steps per dataset, replayed over the shared original
+if "pipelines" not in st.session_state:
+    st.session_state.pipelines = {}
 
-if "report_df_processed" not in st.session_state:
-    st.session_state.report_df_processed = None
-if "monthly_df_processed" not in st.session_state:
-    st.session_state.monthly_df_processed = None
+# Finished datasets by name, offered by the analysis and modeling pages
+if "processed" not in st.session_state:
+    st.session_state.processed = {}
 
 selected_data = st.selectbox(
-    "Select a dataset to preview", list(data_options.keys()), index=None
+    "Select a dataset to preview",
+    list(SHAPEFILE_PATHS) + TABULAR_DATASETS,
+    index=None,
 )
 
-# --- Setup session state dataframes based on selection ---
-if selected_data:
-    if selected_data == "Climate Development Report":
-        if st.session_state.report_df is None:
-            st.session_state.report_df = data_options[selected_data].copy()
-    elif selected_data == "District Wise Monthly Climate":
-        if st.session_state.monthly_df is None:
-            st.session_state.monthly_df = data_options[selected_data].copy()
+# Sheets can be loaded with only some columns, listed from the index without parsing
+pipeline_key = selected_data
+if selected_data in SHEET_DATASETS:
+    sheet_columns = SHEET_DATASETS[selected_data][1]["columns"]
+    load_columns = st.multiselect(
+        "Columns to load", sheet_columns, default=sheet_columns
+    )
+    if not load_columns:
+        st.warning("⚠️ Select at least one column to load.")
+        stop()
+    if load_columns != sheet_columns:
+        pipeline_key = (selected_data, tuple(load_columns))
+
+# --- Setup session state pipeline based on selection ---
+if selected_data in TABULAR_DATASETS and pipeline_key not in st.session_state.pipelines:
+    base = (
+        load_dataset(selected_data)
+        if pipeline_key == selected_data
+        else load_sheet(selected_data, load_columns)
+    )
+    st.session_state.pipelines[pipeline_key] = Pipeline(base)
+
+# Datasets are loaded on first request and shared across sessions, never mutate them
+if selected_data in TABULAR_DATASETS:
+    selected_df = st.session_state.pipelines[pipeline_key].base
+else:
+    selected_df = load_dataset(selected_data) if selected_data else None
 
 # --- Display selected data ---
-if selected_data in geo_data:
-    map = display_shape_file(data_options[selected_data], selected_data)
-    st.pyplot(map)
-elif selected_data in tabular_data:
-    st.dataframe(data_options[selected_data])
+stage("Display")
+if selected_data in SHAPEFILE_PATHS:
+    # Rendered in the browser from GeoJSON pre-built per level of detail
+    detail = st.select_slider(
+        "Map detail",
+        LOD_PIXELS,
+        value=LOD_PIXELS[1],
+        format_func=lambda pixels: f"{pixels} px",
+    )
+    st.plotly_chart(
+        map_figure(
+            selected_data,
+            detail,
+            inline=not st.get_option("server.enableStaticServing"),
+        ),
+        use_container_width=True,
+    )
+elif selected_data in TABULAR_DATASETS:
+    st.dataframe(selected_df)
 else:
     st.info("👆 Select a dataset from the dropdown to preview it!")
 
 
 # --- Preprocessing UI ---
-if selected_data in tabular_data:
-    if selected_data == "Climate Development Report":
-        working_df = st.session_state.report_df
-    else:
-        working_df = st.session_state.monthly_df
+stage("Preprocessing")
+if selected_data in TABULAR_DATASETS:
+    pipeline = st.session_state.pipelines[pipeline_key]
+    working_df = pipeline.materialize()
 
     st.subheader("Dataset Overview")
 
     with st.expander("Column Info: Original Data"):
-        st.write(f"Shape: {get_shape(data_options[selected_data])}")
+        st.write(f"Shape: {get_shape(selected_df)}")
 
         col1, col2 = st.columns(2)
-        dtypes_df, missing_df = get_column_info(data_options[selected_data])
-
-        if st.session_state.dtypes_df is None:
-            st.session_state.dtypes_df = dtypes_df.copy()
-        if st.session_state.missing_df is None:
-            st.session_state.missing_df = missing_df.copy()
+        dtypes_df, missing_df = get_column_info(selected_df)
 
         with col1:
             st.markdown("**Data Types**")
@@ -83,6 +121,15 @@ if selected_data in tabular_data:
             st.markdown("**Missing Values**")
             st.dataframe(missing_df, use_container_width=True)
 
+        if selected_data in SCHEMAS:
+            report = memory_report(selected_df)
+            saved = report["Saved Bytes"].sum() / report["Default Bytes"].sum()
+            st.markdown(
+                f"**Memory Usage** (compact schema saves {saved:.0%} "
+                "compared to loading without declared types)"
+            )
+            st.dataframe(report, use_container_width=True)
+
     st.subheader("Data Reformating")
     reformat_choice = st.radio(
         "Would you like to reformat your dataset to long format?",
@@ -105,7 +152,7 @@ if selected_data in tabular_data:
                 options=working_df.columns.tolist(),
                 help="These columns will remain as they are in the transformed data.",
             )
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             with col1:
                 var_name = st.text_input(
                     "Name for the 'Variable' column",
@@ -118,6 +165,15 @@ if selected_data in tabular_data:
                     placeholder="Value",
                     help="This will be the name of the new column containing the actual data values.",
                 )
+            with col3:
+                var_type = st.selectbox(
+                    "Type of the 'Variable' column",
+                    VARIABLE_TYPES,
+                    help=(
+                        "Year-like headers (2006, YR2006) become integer years and "
+                        "date-like ones datetimes, anything else a categorical."
+                    ),
+                )
             format_button = st.button("🔄 Format Data", use_container_width=True)
 
             if format_button:
@@ -127,22 +183,76 @@ if selected_data in tabular_data:
                     st.error("Please provide both 'Variable' and 'Value' column names.")
                 else:
                     try:
-                        working_df = melt_dataframe(
-                            working_df, id_vars, var_name, value_name
-                        )
-                        if selected_data == "Climate Development Report":
-                            st.session_state.report_df = working_df
-                        elif selected_data == "District Wise Monthly Climate":
-                            st.session_state.monthly_df = working_df
-
-                        st.session_state.dtypes_df, st.session_state.missing_df = (
-                            get_column_info(working_df)
+                        working_df = pipeline.apply(
+                            "melt",
+                            id_vars=id_vars,
+                            var_name=var_name,
+                            value_name=value_name,
+                            var_type=var_type,
                         )
                         st.success("Dataset reformatted successfully!")
                         st.subheader("Long Format Data")
                     except Exception as e:
                         st.error(f"Something went wrong while reformatting: {e}")
 
+        with st.expander("📐 Reformat Data: Convert Long → Wide Format"):
+            columns = working_df.columns.tolist()
+            col1, col2 = st.columns(2)
+            with col1:
+                pivot_columns = st.selectbox(
+                    "Column whose values become the new headers", columns
+                )
+            with col2:
+                pivot_values = st.selectbox(
+                    "Column holding the values",
+                    [col for col in columns if col != pivot_columns],
+                )
+            pivot_index = st.multiselect(
+                "Columns identifying each row:",
+                [col for col in columns if col not in (pivot_columns, pivot_values)],
+            )
+            if st.button("🔄 Pivot Data", use_container_width=True):
+                if not pivot_index:
+                    st.error("Select at least one column identifying each row.")
+                else:
+                    try:
+                        working_df = pipeline.apply(
+                            "pivot",
+                            index=pivot_index,
+                            columns=pivot_columns,
+                            values=pivot_values,
+                        )
+                        st.success("Dataset pivoted successfully!")
+                    except Exception as e:
+                        st.error(f"Something went wrong while pivoting: {e}")
+
+    if {"LAT", "LON"} <= set(working_df.columns):
+        st.divider()
+        st.subheader("Spatial Join")
+        with st.expander("🗺️ Attach Province and District From Boundary Maps"):
+            st.markdown(
+                "Looks up the boundary polygon containing each row's LAT/LON and adds "
+                "its province and district, e.g. for province-level aggregation."
+            )
+            levels = admin_levels()
+            if not levels:
+                st.warning("⚠️ No province or district boundary layer is available.")
+            if st.button(
+                "📍 Attach Admin Areas", use_container_width=True, disabled=not levels
+            ):
+                try:
+                    before = set(working_df.columns)
+                    working_df = pipeline.apply("admin")
+                    added = [col for col in working_df.columns if col not in before]
+                    if added:
+                        st.success(f"Added {', '.join(added)}.")
+                    else:
+                        st.warning(
+                            "⚠️ The boundary layers have none of the expected attributes."
+                        )
+                except Exception as e:
+                    st.error(f"Something went wrong during the spatial join: {e}")
+
     st.divider()
     if missing_df["Missing"].sum() > 0:
         st.subheader("Missing Values")
@@ -151,44 +261,18 @@ if selected_data in tabular_data:
 
             strategy = st.selectbox(
                 "Select a strategy",
-                [
-                    "None",
-                    "Drop rows",
-                    "Drop columns",
-                    "Fill with mean",
-                    "Fill with median",
-                    "Fill with mode",
-                ],
+                ["None"] + get_missing_value_strategies(working_df),
+                help=(
+                    "District strategies fill each gap from the same district "
+                    "(and month), which suits climate data better than global values."
+                ),
             )
 
             if strategy != "None":
                 apply_missing = st.button("🚀 Apply Missing Value Strategy")
                 if apply_missing:
                     try:
-                        if strategy == "Drop rows":
-                            working_df = working_df.dropna()
-                        elif strategy == "Drop columns":
-                            working_df = working_df.dropna(axis=1)
-                        elif strategy == "Fill with mean":
-                            working_df = working_df.fillna(
-                                working_df.mean(numeric_only=True)
-                            )
-                        elif strategy == "Fill with median":
-                            working_df = working_df.fillna(
-                                working_df.median(numeric_only=True)
-                            )
-                        elif strategy == "Fill with mode":
-                            working_df = working_df.fillna(working_df.mode().iloc[0])
-
-                        if selected_data == "Climate Development Report":
-                            st.session_state.report_df = working_df
-                        elif selected_data == "District Wise Monthly Climate":
-                            st.session_state.monthly_df = working_df
-
-                        st.session_state.dtypes_df, st.session_state.missing_df = (
-                            get_column_info(working_df)
-                        )
-
+                        working_df = pipeline.apply("missing", strategy=strategy)
                         st.success(f"Missing value strategy '{strategy}' applied.")
                     except Exception as e:
                         st.error(f"Error applying strategy: {e}")
@@ -196,63 +280,65 @@ if selected_data in tabular_data:
     st.divider()
     st.subheader("Convert Columns' DataType")
     with st.expander("Convert Column"):
-        type_options = [
-            "string",
-            "int64",
-            "float",
-            "boolean",
-            "category",
-            "datetime64[ns]",
-            "timedelta[ns]",
-            "object",
-        ]
-
-        st.write("Choose new data types for each column:")
-
-        col1, col2 = st.columns([1, 3])
-        new_type = {}
-        dtypes_df = st.session_state.dtypes_df
-
-        for i, r in dtypes_df.iterrows():
-            with col1:
-                st.text_input(
-                    label=f"{r['Column']}",
-                    value=f"{r['Column']}",
-                    disabled=True,
-                    label_visibility="collapsed",
-                )
+        dtypes_df, missing_df = pipeline.column_info()
+        suggested = pipeline.suggested_types()
+        start_suggested = st.toggle(
+            "Start from the suggested types",
+            help="Smallest lossless types, inferred from a sample of each column",
+        )
 
-            with col2:
-                selected_type = st.selectbox(
-                    label=f"{r['Type']}",
-                    options=type_options,
-                    index=(
-                        type_options.index(r["Type"])
-                        if r["Type"] in type_options
-                        else 2
-                    ),
-                    label_visibility="collapsed",
-                    key=f"select_{r['Column']}",
+        # One editor for every column, instead of a pair of widgets per column
+        types_df = dtypes_df.assign(
+            Missing=missing_df["Missing"].values,
+            Suggested=dtypes_df["Column"].map(suggested).values,
+        )
+        types_df["New Type"] = (
+            types_df["Suggested"] if start_suggested else types_df["Type"]
+        )
+        type_options = list(dict.fromkeys(DTYPE_OPTIONS + types_df["Type"].tolist()))
+        edited_types = st.data_editor(
+            types_df,
+            column_config={
+                "New Type": st.column_config.SelectboxColumn(
+                    options=type_options, required=True
                 )
-
-            new_type[r["Column"]] = selected_type
+            },
+            disabled=["Column", "Type", "Missing", "Suggested"],
+            hide_index=True,
+            use_container_width=True,
+            # A new state or starting point resets the edits
+            key=f"dtypes_{pipeline_key}_{id(working_df)}_{start_suggested}",
+        )
+        new_types = {
+            col: new
+            for col, old, new in zip(
+                edited_types["Column"], edited_types["Type"], edited_types["New Type"]
+            )
+            if new != old
+        }
+        st.caption(f"{len(new_types)} columns to convert")
 
         apply_datatype = st.button(
-            "Apply Data Types To The Columns", use_container_width=True
+            "Apply Data Types To The Columns",
+            use_container_width=True,
+            disabled=not new_types,
         )
 
         if apply_datatype:
+            before = working_df.memory_usage(deep=True).sum()
             try:
-                working_df = working_df.astype(new_type)
-                if selected_data == "Climate Development Report":
-                    st.session_state.report_df = working_df
-                elif selected_data == "District Wise Monthly Climate":
-                    st.session_state.monthly_df = working_df
-
-                st.session_state.dtypes_df, st.session_state.missing_df = (
-                    get_column_info(working_df)
-                )
-                st.success("Data types successfully updated.")
+                # Columns that fail are reported, the others are still converted
+                failures = pipeline.convert(new_types)
+                working_df = pipeline.materialize()
+                converted = len(new_types) - len(failures)
+                if converted:
+                    after = working_df.memory_usage(deep=True).sum()
+                    st.success(
+                        f"Converted {converted} columns, "
+                        f"{before / 2**20:.2f} MB → {after / 2**20:.2f} MB."
+                    )
+                for col, error in failures.items():
+                    st.error(f"{col} → {new_types[col]}: {error}")
             except Exception as e:
                 st.error(f"Something went wrong while assigning data types: {e}")
 
@@ -263,7 +349,7 @@ if selected_data in tabular_data:
         st.write(f"Shape: {get_shape(working_df)}")
 
         col1, col2 = st.columns(2)
-        dtypes_df, missing_df = st.session_state.dtypes_df, st.session_state.missing_df
+        dtypes_df, missing_df = pipeline.column_info()
 
         with col1:
             st.markdown("**Data Types**")
@@ -274,14 +360,36 @@ if selected_data in tabular_data:
 
         st.dataframe(working_df, use_container_width=True)
 
+        st.markdown("**Applied Steps**")
+        steps = pipeline.describe_steps()
+        if steps:
+            st.write("\n".join(f"{i}. {step}" for i, step in enumerate(steps, 1)))
+        else:
+            st.write("No preprocessing steps applied yet.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button(
+                "↩️ Undo Last Step",
+                on_click=pipeline.undo,
+                disabled=not pipeline.can_undo,
+                use_container_width=True,
+            )
+        with col2:
+            st.button(
+                "↪️ Redo Step",
+                on_click=pipeline.redo,
+                disabled=not pipeline.can_redo,
+                use_container_width=True,
+            )
+
     completion_button = st.button(
         "Complete Preprocessing for this Dataset", use_container_width=True
     )
 
     if completion_button:
-        if selected_data == "Climate Development Report":
-            st.session_state.report_df_processed = st.session_state.report_df
-        elif selected_data == "District Wise Monthly Climate":
-            st.session_state.monthly_df_processed = st.session_state.monthly_df
+        st.session_state.processed[selected_data] = pipeline.materialize()
 
         st.success("✅ Dataset preprocessing complete and saved.")
+
+finish_rerun()
@@ -1,7 +1,25 @@
+import os
+
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+from utils.aggregates import (
+    CUBE_STATISTICS,
+    can_build_cube,
+    cube_measures,
+    load_cube,
+    rollup,
+)
+from utils.downsample import DOWNSAMPLE_METHODS
+from utils.figures import (
+    box_plot_image,
+    choropleth_image,
+    correlation_heatmap_image,
+    histogram_image,
+    line_plot_image,
+)
+from utils.ingest import PARTITION_STORE_DIR, select_partitions
+from utils.profiling import finish_rerun, sidebar_panel, stage, start_rerun, stop
+from utils.statistics import dataset_statistics
 
 st.set_page_config(
     page_title="Climate Change Dashboard - Data Analysis",
@@ -9,78 +27,129 @@ st.set_page_config(
     layout="wide",
 )
 
+# Timings of this rerun, shown in the sidebar on the next one
+start_rerun("Data Analysis")
+sidebar_panel()
+
 st.title("📊 Data Analysis")
 
+has_partition_store = os.path.isdir(PARTITION_STORE_DIR)
+
 # --- Check if processed datasets exist ---
-if (
-    st.session_state.get("report_df_processed") is None
-    and st.session_state.get("monthly_df_processed") is None
-):
+processed = st.session_state.get("processed", {})
+if not processed and not has_partition_store:
     st.warning("⚠️ Please complete data preprocessing before analyzing the data.")
-    st.stop()
+    stop()
 
 # --- Dataset Selection ---
-dataset_options = {}
-if st.session_state.get("report_df_processed") is not None:
-    dataset_options["Climate Development Report"] = st.session_state.report_df_processed
-if st.session_state.get("monthly_df_processed") is not None:
-    dataset_options["District Wise Monthly Climate"] = (
-        st.session_state.monthly_df_processed
-    )
+stage("Dataset selection")
+dataset_options = dict(processed)
+if has_partition_store:
+    dataset_options["Partitioned Climate Store"] = None
 
 selected_data = st.selectbox("Select a processed dataset", list(dataset_options.keys()))
 
-df = dataset_options[selected_data]
+if selected_data == "Partitioned Climate Store":
+    # Only the partitions for the chosen districts and years are read from disk
+    df = select_partitions()
+else:
+    df = dataset_options[selected_data]
 
 st.write(f"### Dataset: {selected_data}")
 st.dataframe(df, use_container_width=True)
 
 # --- Summary Statistics ---
+stage("Statistics")
 st.subheader("📈 Descriptive Statistics")
-st.dataframe(df.describe(include="all").transpose(), use_container_width=True)
+# Computed once per dataset version and shared across sessions
+st.dataframe(dataset_statistics(df).describe(), use_container_width=True)
 
 # --- Column Selection ---
 numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
 if not numeric_cols:
     st.warning("No numeric columns available for analysis.")
-    st.stop()
+    stop()
 
 col1, col2 = st.columns(2)
 
 # --- Histogram ---
+stage("Histogram")
 with col1:
     st.write("### Histogram")
     hist_col = st.selectbox("Select a column for histogram", numeric_cols)
-    fig, ax = plt.subplots()
-    sns.histplot(df[hist_col].dropna(), kde=True, ax=ax)
-    st.pyplot(fig)
+    st.image(histogram_image(df, hist_col), use_container_width=True)
 
 # --- Line Plot ---
+stage("Line plot")
 with col2:
     st.write("### Line Plot")
     time_col = st.selectbox("Select x-axis (e.g. time or ID)", df.columns)
     value_col = st.selectbox("Select y-axis (numeric)", numeric_cols, key="line_plot")
-    fig, ax = plt.subplots()
-    df_sorted = df.sort_values(by=time_col)
-    ax.plot(df_sorted[time_col], df_sorted[value_col])
-    ax.set_xlabel(time_col)
-    ax.set_ylabel(value_col)
-    ax.set_title(f"{value_col} over {time_col}")
-    plt.xticks(rotation=45)
-    st.pyplot(fig)
+    line_method = st.radio(
+        "Downsampling", DOWNSAMPLE_METHODS, horizontal=True, key="line_method"
+    )
+    line_group = None
+    if "DISTRICT" in df.columns and time_col != "DISTRICT":
+        if st.checkbox("One line per district", key="line_group"):
+            line_group = "DISTRICT"
+    st.image(
+        line_plot_image(df, time_col, value_col, line_group, line_method),
+        use_container_width=True,
+    )
 
 # --- Box Plot ---
+stage("Box plot")
 st.write("### Box Plot")
 box_col = st.selectbox("Select column for box plot", numeric_cols, key="box_plot")
-fig, ax = plt.subplots()
-sns.boxplot(y=df[box_col], ax=ax)
-st.pyplot(fig)
+st.image(box_plot_image(df, box_col), use_container_width=True)
 
 # --- Correlation Heatmap ---
+stage("Correlation heatmap")
 st.write("### 🔥 Correlation Heatmap")
 if len(numeric_cols) > 1:
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.heatmap(df[numeric_cols].corr(), annot=True, cmap="coolwarm", ax=ax)
-    st.pyplot(fig)
+    st.image(correlation_heatmap_image(df, numeric_cols), use_container_width=True)
 else:
     st.info("Not enough numeric columns for correlation heatmap.")
+
+# --- Climate Trends ---
+stage("Climate trends")
+if can_build_cube(df):
+    st.write("### 🗺️ Climate Trends")
+    # Aggregates come from a precomputed district x month cube, not the raw rows
+    cube = load_cube(df)
+    areas = ["National"] + [col for col in ["PROVINCE", "DISTRICT"] if col in cube]
+    years = (int(cube["YEAR"].min()), int(cube["YEAR"].max()))
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        trend_measure = st.selectbox("Measure", cube_measures(cube), key="trend")
+    with col2:
+        trend_stat = st.selectbox("Statistic", CUBE_STATISTICS, key="trend_stat")
+    with col3:
+        trend_area = st.selectbox("Area", areas, key="trend_area")
+    if years[0] < years[1]:
+        trend_years = st.slider("Years", years[0], years[1], years, key="trend_years")
+    else:
+        # A slider needs two distinct bounds
+        trend_years = years
+        st.caption(f"Years: {years[0]}")
+
+    by = [] if trend_area == "National" else [trend_area]
+    trend = rollup(cube, by + ["YEAR"], [trend_measure], trend_stat, YEAR=trend_years)[
+        trend_measure
+    ]
+    st.line_chart(trend.unstack(trend_area) if by else trend)
+
+    if "PROVINCE" in cube:
+        by_province = rollup(
+            cube, ["PROVINCE"], [trend_measure], trend_stat, YEAR=trend_years
+        )[trend_measure]
+        title = (
+            f"{trend_stat.title()} {trend_measure}, {trend_years[0]}–{trend_years[1]}"
+        )
+        st.image(
+            choropleth_image(by_province, "Provincial Boundary", "State", title),
+            use_container_width=True,
+        )
+
+finish_rerun()
@@ -1,34 +1,174 @@
+import os
+import uuid
+
 import streamlit as st
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.metrics import mean_absolute_error, r2_score, root_mean_squared_error
 import pandas as pd
 import numpy as np
-import time
-import pickle
+
+from utils.cache import fingerprint
+from utils.downsample import downsample_columns
+from utils.forecasting import FORECAST_MODELS, FORECAST_TARGETS, can_forecast
+from utils.ingest import PARTITION_STORE_DIR, select_partitions
+from utils.jobs import ACTIVE_STATES, job_runner
+from utils.model_search import SEARCH_SPACE, leaderboard, search_candidates
+from utils.models import model_registry
+from utils.profiling import finish_rerun, sidebar_panel, stage, start_rerun, stop
+from utils.training import SINGLE_MODELS
+
+
+@st.fragment(run_every=2)
+def poll_job(job_id):
+    # Only this block reruns while the job works, the rest of the page stays idle
+    status = job_runner.status(job_id)
+    if status["state"] not in ACTIVE_STATES:
+        st.rerun()
+    st.progress(status["progress"], text=status["message"])
+    partial = job_runner.partial(job_id)
+    if partial and status["kind"] == "search":
+        st.dataframe(leaderboard(partial), use_container_width=True)
+    if st.button("⏹️ Cancel", key=f"cancel_{job_id}"):
+        job_runner.cancel(job_id)
+
+
+def job_result(slot, df, params):
+    """Shows the state of the session's job in a slot, returning its result once done."""
+    job_id = st.session_state.get(slot)
+    status = job_runner.status(job_id) if job_id else None
+    if status is None or (status["data"], status["params"]) != (
+        fingerprint(df),
+        params,
+    ):
+        return None
+    if status["state"] in ACTIVE_STATES:
+        poll_job(job_id)
+    elif status["state"] == "failed":
+        st.error(f"❌ Training failed: {status['message']}")
+    elif status["state"] != "done":
+        st.warning(f"⚠️ Training {status['state']}: {status['message']}")
+    else:
+        return job_runner.result(job_id)
+    return None
+
 
 st.title("🧠 Model Training and Evaluation")
 
-# Step 1: Choose available dataset
-available_datasets = {
-    "Climate Development Report": st.session_state.get("report_df_processed"),
-    "District Wise Monthly Climate": st.session_state.get("monthly_df_processed"),
-}
+# Timings of this rerun, shown in the sidebar on the next one
+start_rerun("Modeling")
+sidebar_panel()
+
+# Identifies this session's jobs, which keep running across reruns and page changes
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+owner = st.session_state["session_id"]
 
-available_datasets = {k: v for k, v in available_datasets.items() if v is not None}
+stage("Jobs")
+my_jobs = job_runner.jobs(owner)
+if my_jobs:
+    with st.expander(f"🗂️ Training Jobs ({len(my_jobs)})"):
+        st.dataframe(
+            pd.DataFrame(my_jobs)[["id", "kind", "state", "progress", "message"]],
+            use_container_width=True,
+        )
+
+# Step 1: Choose available dataset
+available_datasets = dict(st.session_state.get("processed", {}))
+if os.path.isdir(PARTITION_STORE_DIR):
+    available_datasets["Partitioned Climate Store"] = None
 
 if not available_datasets:
     st.warning("⚠️ No processed datasets found. Please complete preprocessing first.")
-    st.stop()
+    stop()
 
 selected_dataset = st.selectbox(
-    "Choose a processed dataset", list(available_datasets.keys()), index=1
+    "Choose a processed dataset",
+    list(available_datasets.keys()),
+    # The monthly climate data is what most models are trained on
+    index=(
+        list(available_datasets).index("District Wise Monthly Climate")
+        if "District Wise Monthly Climate" in available_datasets
+        else 0
+    ),
 )
-df = available_datasets[selected_dataset]
+if selected_dataset == "Partitioned Climate Store":
+    # Only the partitions for the chosen districts and years are read from disk
+    df = select_partitions()
+else:
+    df = available_datasets[selected_dataset]
 st.dataframe(df.head())
 
+stage("Task")
+task = "Regression"
+if can_forecast(df):
+    task = st.radio("Task", ["Regression", "Forecasting"], horizontal=True)
+
+if task == "Forecasting":
+    # Forecasts learn from each district's own past, so rows are never shuffled
+    st.subheader("📅 District Forecasting")
+    targets = [col for col in FORECAST_TARGETS if col in df.columns]
+    targets += [
+        col
+        for col in df.select_dtypes(include="number").columns
+        if col not in targets + ["YEAR", "MONTH", "LAT", "LON"]
+    ]
+
+    col1, col2 = st.columns(2)
+    with col1:
+        target = st.selectbox("Target", targets)
+        forecast_model = st.selectbox("Model", list(FORECAST_MODELS))
+    with col2:
+        horizon = st.slider("Forecast horizon (months ahead)", 1, 12, 1)
+        n_splits = st.slider("Rolling-origin splits", 1, 6, 3)
+
+    forecast_params = {
+        "target": target,
+        "model": forecast_model,
+        "horizon": horizon,
+        "n_splits": n_splits,
+    }
+    if st.button("🚀 Backtest and Forecast"):
+        st.session_state["forecast_job"] = job_runner.submit(
+            "forecast", df, forecast_params, owner
+        )
+
+    result = job_result("forecast_job", df, forecast_params)
+    if result is not None:
+        scores = result["scores"]
+        predictions = result["predictions"]
+        future = result["future"]
+
+        st.subheader("📊 Backtest Results")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("R² Score", round(scores["r2"].mean(), 4))
+        with col2:
+            st.metric("RMSE", round(scores["rmse"].mean(), 4))
+        with col3:
+            st.metric("MAE", round(scores["mae"].mean(), 4))
+        st.dataframe(scores, use_container_width=True)
+
+        district = st.selectbox(
+            "District",
+            predictions["DISTRICT"].cat.remove_unused_categories().cat.categories,
+        )
+        chart = predictions[predictions["DISTRICT"] == district]
+        chart = chart.assign(
+            DATE=pd.to_datetime(dict(year=chart["YEAR"], month=chart["MONTH"], day=1))
+        )
+        st.line_chart(chart.set_index("DATE")[["Actual", "Predicted"]])
+
+        st.subheader("🔭 Forecast")
+        st.dataframe(future, use_container_width=True)
+        st.download_button(
+            label="📥 Download Forecast",
+            data=future.to_csv(index=False),
+            file_name=f"{target}_forecast.csv",
+            mime="text/csv",
+            use_container_width=True,
+        )
+    stop()
+
 # Step 2: Feature Selection
+stage("Feature selection")
 st.subheader("🔢 Feature Selection")
 
 all_columns = df.columns.tolist()
@@ -67,7 +207,7 @@ y_column = st.session_state.get("y_column")
 
 if not x_columns or not y_column:
     st.warning("Please select features and confirm to proceed.")
-    st.stop()
+    stop()
 
 # Step 3: Train-Test Split
 st.subheader("🧪 Train-Test Split")
@@ -75,60 +215,116 @@ test_size_percent = st.slider(
     "Test size (%)", min_value=10, max_value=50, value=20, step=5
 )
 test_size = test_size_percent / 100
+keep_time_order = st.checkbox(
+    "Keep time order (train on earlier rows, test on later ones)",
+    value="DATE" in df.columns,
+)
+
 
 # Step 4: Model Selection
 st.subheader("🧮 Model Selection")
-model_choice = st.selectbox("Choose a model", ["Linear Regression", "Decision Tree"])
+training_mode = st.radio(
+    "Training mode", ["Single model", "Compare models"], horizontal=True
+)
 
-# Step 5: Train model
-train_button = st.button("🚀 Train Model")
+train_params = {
+    "x_columns": x_columns,
+    "y_column": y_column,
+    "test_size": test_size,
+    "keep_time_order": keep_time_order,
+}
 
-if train_button:
-    with st.spinner("Training the model..."):
-        time.sleep(1)  # Simulate loading
-        X = df[x_columns]
-        y = df[y_column]
+if training_mode == "Single model":
+    model_choice = st.selectbox("Choose a model", list(SINGLE_MODELS))
+    train_params["model"] = model_choice
 
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=test_size, random_state=42
+    # Step 5: Train model
+    if st.button("🚀 Train Model"):
+        st.session_state["train_job"] = job_runner.submit(
+            "train", df, train_params, owner
+        )
+else:
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        search_models = st.multiselect(
+            "Models to compare",
+            list(SEARCH_SPACE),
+            default=["Ridge", "Random Forest", "Gradient Boosting"],
+        )
+    with col2:
+        search_mode = st.selectbox("Search", ["Grid", "Random"], index=1)
+        n_iter = st.number_input(
+            "Candidates per model",
+            min_value=1,
+            max_value=50,
+            value=4,
+            disabled=search_mode == "Grid",
         )
+    with col3:
+        n_splits = st.number_input("CV folds", min_value=2, max_value=10, value=5)
+        n_jobs = st.number_input(
+            "Worker processes",
+            min_value=1,
+            max_value=os.cpu_count(),
+            value=os.cpu_count(),
+        )
+    train_params.update(
+        models=search_models,
+        search_mode=search_mode,
+        n_iter=n_iter,
+        n_splits=n_splits,
+        n_jobs=n_jobs,
+    )
 
-        if model_choice == "Linear Regression":
-            model = LinearRegression()
-        else:
-            model = DecisionTreeRegressor(random_state=42)
+    candidates = search_candidates(search_models, search_mode, n_iter)
+    st.caption(
+        f"{len(candidates)} candidates × {n_splits} folds = "
+        f"{len(candidates) * n_splits} fits"
+    )
 
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
+    # Step 5: Run the search
+    if st.button("🏁 Run Search", disabled=not candidates):
+        st.session_state["train_job"] = job_runner.submit(
+            "search", df, train_params, owner
+        )
 
-        # Step 6: Evaluation
-        st.success("✅ Model training completed!")
-        st.subheader("📊 Evaluation Results")
+stage("Results")
+result = job_result("train_job", df, train_params)
+if result is not None:
+    if "results" in result:
+        st.subheader("🏆 Leaderboard")
+        st.dataframe(leaderboard(result["results"]), use_container_width=True)
 
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("R² Score", round(r2_score(y_test, y_pred), 4))
-        with col2:
-            rmse = root_mean_squared_error(y_test, y_pred)
-            st.metric("RMSE", round(rmse, 4))
-        with col3:
-            st.metric("MAE", round(mean_absolute_error(y_test, y_pred), 4))
-
-        result_df = pd.DataFrame({"Actual": y_test.values, "Predicted": y_pred})
-        st.dataframe(result_df.head())
-
-        st.line_chart(result_df.head(200))
-
-        # Save and allow download
-        model_filename = "trained_model.pkl"
-        with open(model_filename, "wb") as f:
-            pickle.dump(model, f)
-
-        with open(model_filename, "rb") as f:
-            st.download_button(
-                label="📥 Download Trained Model",
-                data=f,
-                file_name=model_filename,
-                mime="application/octet-stream",
-                use_container_width=True,
-            )
+    model_name, model_id = result["model_name"], result["model_id"]
+    y_test, y_pred = result["y_test"], result["y_pred"]
+    st.session_state["model_id"] = model_id
+
+    # Step 6: Evaluation
+    st.success(f"✅ Model training completed! ({model_name}, version `{model_id}`)")
+    st.subheader("📊 Evaluation Results")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("R² Score", round(result["metrics"]["r2"], 4))
+    with col2:
+        st.metric("RMSE", round(result["metrics"]["rmse"], 4))
+    with col3:
+        st.metric("MAE", round(result["metrics"]["mae"], 4))
+
+    result_df = pd.DataFrame({"Actual": y_test.values, "Predicted": y_pred})
+    st.dataframe(result_df.head())
+
+    # Every test row, reduced to the extremes that are visible at chart width
+    st.line_chart(downsample_columns(result_df, ["Actual", "Predicted"], 1000))
+
+    # Allow download of the registered model version
+    with open(model_registry.path(model_id), "rb") as f:
+        st.download_button(
+            label="📥 Download Trained Model",
+            data=f,
+            file_name=f"model_{model_id}.pkl",
+            mime="application/octet-stream",
+            use_container_width=True,
+        )
+
+finish_rerun()
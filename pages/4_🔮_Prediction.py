@@ -1,57 +1,166 @@
+import os
+
 import streamlit as st
-import pickle
-import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from utils.data_loader import load_dataset
+from utils.models import model_registry
+from utils.profiling import finish_rerun, sidebar_panel, stage, start_rerun, stop
+from utils.scoring import (
+    ID_COLUMNS,
+    climate_rows,
+    frame_chunks,
+    read_chunks,
+    score_to_file,
+)
 
 st.title("🔮 Model Prediction")
 
-# Step 1: Load the trained model from session state
-model_filename = "trained_model.pkl"
+# Timings of this rerun, shown in the sidebar on the next one
+start_rerun("Prediction")
+sidebar_panel()
 
-try:
-    with open(model_filename, "rb") as f:
-        model = pickle.load(f)
-except FileNotFoundError:
+# Step 1: Choose a registered model version
+versions = model_registry.versions()
+if not versions:
     st.warning("⚠️ No trained model found. Please train a model first.")
-    st.stop()
-
-# Step 2: Retrieve x_columns and y_column from session state
-x_columns = st.session_state.get("x_columns")
-if not x_columns:
-    st.warning("⚠️ No feature columns found. Please train a model first.")
-    st.stop()
-
-# Step 3: Create a form for input features
-st.subheader("🔢 Enter Input Features")
-input_data = {}
-
-with st.form("input_form"):
-    for col_name in x_columns:
-        # Check if the column is numeric or categorical and create appropriate input widget
-        column_data_type = st.session_state.get(
-            col_name, "numeric"
-        )  # Default to numeric if not found
-        if column_data_type == "numeric":
-            input_data[col_name] = st.number_input(
-                f"Enter value for {col_name}", value=0.0
+    stop()
+
+ids = [meta["id"] for meta in versions]
+labels = {
+    meta["id"]: f"{meta['id']} · {meta['name']} → {meta['target']} "
+    f"(R² {meta['metrics'].get('r2', float('nan')):.3f})"
+    for meta in versions
+}
+# The session's most recently trained model is preselected
+default_id = st.session_state.get("model_id")
+model_id = st.selectbox(
+    "Model version",
+    ids,
+    index=ids.index(default_id) if default_id in ids else 0,
+    format_func=labels.get,
+)
+stage("Model loading")
+meta = model_registry.meta(model_id)
+model = model_registry.load(model_id)
+
+# Step 2: Feature columns and dtypes recorded with the model
+x_columns = meta["features"]
+dtypes = meta["dtypes"]
+
+single_tab, batch_tab = st.tabs(["✍️ Single Row", "📦 Batch"])
+
+with single_tab:
+    # Step 3: Create a form for input features
+    stage("Single row")
+    st.subheader("🔢 Enter Input Features")
+    input_data = {}
+
+    with st.form("input_form"):
+        for col_name in x_columns:
+            # Numeric features get a number input, anything else is entered as text
+            if is_numeric_dtype(pd.api.types.pandas_dtype(dtypes[col_name])):
+                input_data[col_name] = st.number_input(
+                    f"Enter value for {col_name}", value=0.0
+                )
+            else:
+                input_data[col_name] = st.text_input(f"Enter value for {col_name}")
+
+        # Submit button to trigger prediction
+        submitted = st.form_submit_button("🔮 Predict")
+
+    # Step 4: Make prediction and display the result
+    if submitted:
+        # Prepare the input features for prediction, in training column order
+        input_features = pd.DataFrame([input_data], columns=x_columns)
+
+        with st.spinner("Making prediction..."):
+            prediction = model.predict(input_features)
+
+        # Step 5: Display prediction result
+        st.success("✅ Prediction complete!")
+        st.subheader("📊 Prediction Results")
+        st.write(
+            f"The predicted value for {meta['target']} (model `{model_id}`) is: "
+            f"{prediction[0]}"
+        )
+
+with batch_tab:
+    # Step 3: Choose the rows to score
+    stage("Batch scoring")
+    st.subheader("📦 Batch Scoring")
+    source = st.radio(
+        "Rows to score", ["Upload a file", "Climate data range"], horizontal=True
+    )
+
+    chunks, key = None, None
+    if source == "Upload a file":
+        upload = st.file_uploader("CSV or Parquet file", type=["csv", "parquet"])
+        if upload is not None:
+            chunks = read_chunks(upload, upload.name)
+            key = (upload.name, upload.size, upload.file_id)
+    else:
+        # The processed dataset is used when it still has its calendar columns
+        climate_df = st.session_state.get("processed", {}).get(
+            "District Wise Monthly Climate"
+        )
+        if climate_df is None or not {"DISTRICT", "DATE", "YEAR", "MONTH"} <= set(
+            climate_df.columns
+        ):
+            climate_df = load_dataset("District Wise Monthly Climate")
+        districts = sorted(climate_df["DISTRICT"].dropna().unique())
+        first_year = int(climate_df["YEAR"].min())
+        last_year = int(climate_df["YEAR"].max())
+
+        selected_districts = st.multiselect("Districts", districts, default=districts)
+        # Years past the data are scored on calendar and location features only,
+        # so they are offered only to models that need nothing else
+        future_years = 10 if set(x_columns) <= set(ID_COLUMNS) else 0
+        if first_year < last_year + future_years:
+            selected_years = st.slider(
+                "Years",
+                first_year,
+                last_year + future_years,
+                (last_year, last_year + min(future_years, 1)),
             )
         else:
-            input_data[col_name] = st.selectbox(
-                f"Select value for {col_name}",
-                options=["Option 1", "Option 2", "Option 3"],
+            # A slider needs two distinct bounds
+            selected_years = (first_year, first_year)
+            st.caption(f"Years: {first_year}")
+        try:
+            rows = climate_rows(
+                climate_df, selected_districts, selected_years, x_columns
             )
+            st.caption(f"{len(rows):,} rows selected")
+            chunks = frame_chunks(rows)
+            key = (tuple(selected_districts), selected_years)
+        except ValueError as e:
+            st.error(f"❌ {e}")
 
-    # Submit button to trigger prediction
-    submitted = st.form_submit_button("🔮 Predict")
+    # Step 4: Score in chunks and offer the result for download
+    if st.button("🔮 Score Rows", disabled=chunks is None):
+        try:
+            with st.spinner("Scoring rows..."):
+                path, n_rows = score_to_file(model, chunks, meta, key)
+            st.session_state["batch_predictions"] = (model_id, key, path, n_rows)
+        except ValueError as e:
+            st.error(f"❌ {e}")
 
-# Step 4: Make prediction and display the result
-if submitted:
-    # Prepare the input features for prediction
-    input_features = np.array([list(input_data.values())]).reshape(1, -1)
-
-    with st.spinner("Making prediction..."):
-        prediction = model.predict(input_features)
+    batch = st.session_state.get("batch_predictions")
+    # Files least recently used by any session are pruned, score again if it is gone
+    if batch and batch[:2] == (model_id, key) and os.path.exists(batch[2]):
+        _, _, path, n_rows = batch
+        os.utime(path)
+        st.success(f"✅ Scored {n_rows:,} rows with model `{model_id}`")
+        st.dataframe(pd.read_csv(path, nrows=100), use_container_width=True)
+        with open(path, "rb") as f:
+            st.download_button(
+                label="📥 Download Predictions",
+                data=f,
+                file_name=f"predictions_{model_id}.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
 
-    # Step 5: Display prediction result
-    st.success("✅ Prediction complete!")
-    st.subheader("📊 Prediction Results")
-    st.write(f"The predicted value for the target column is: {prediction[0]}")
+finish_rerun()
@@ -0,0 +1,127 @@
+import os
+
+import pandas as pd
+
+from utils.cache import LRUCache, fingerprint, prune_directory
+from utils.spatial import attach_admin_ids
+from utils.profiling import timed
+
+CUBE_CACHE_DIR = os.environ.get("CUBE_CACHE_DIR", ".cache/cubes")
+# Bound on the cubes kept on disk, least recently used are removed first
+CUBE_DISK_MAX_BYTES = int(os.environ.get("CUBE_DISK_MAX_MB", 512)) << 20
+CUBE_DIMENSIONS = ["DISTRICT", "PROVINCE", "YEAR", "MONTH", "SEASON"]
+CUBE_STATISTICS = ["sum", "mean", "min", "max", "count"]
+NON_MEASURE_COLUMNS = ["LAT", "LON", "PROVINCE_CODE", "DISTRICT_ID"]
+
+# Nepal's climatological seasons
+SEASONS = {
+    12: "Winter",
+    1: "Winter",
+    2: "Winter",
+    3: "Pre-monsoon",
+    4: "Pre-monsoon",
+    5: "Pre-monsoon",
+    6: "Monsoon",
+    7: "Monsoon",
+    8: "Monsoon",
+    9: "Monsoon",
+    10: "Post-monsoon",
+    11: "Post-monsoon",
+}
+
+cube_cache = LRUCache(int(os.environ.get("CUBE_CACHE_MAX_MB", 128)) << 20, name="cubes")
+
+
+def can_build_cube(df: pd.DataFrame):
+    return {"DISTRICT", "YEAR", "MONTH"} <= set(df.columns)
+
+
+def build_cube(df: pd.DataFrame, measures=None):
+    """Aggregates rows to one row per district and month with additive statistics.
+
+    Sum, count, min and max are kept per measure, so any coarser rollup (and
+    its mean) can be derived from the cube without touching the rows again.
+    """
+    if "PROVINCE" not in df.columns and {"LAT", "LON"} <= set(df.columns):
+        df = attach_admin_ids(df)
+    if measures is None:
+        measures = [
+            col
+            for col in df.select_dtypes(include="number").columns
+            if col not in CUBE_DIMENSIONS + NON_MEASURE_COLUMNS
+        ]
+
+    keys = [col for col in ["DISTRICT", "PROVINCE", "YEAR", "MONTH"] if col in df]
+    grouped = df.groupby(keys, observed=True)[measures]
+    cube = grouped.agg(["sum", "count", "min", "max"])
+    cube.columns = [f"{measure}_{stat}" for measure, stat in cube.columns]
+    cube = cube.reset_index()
+    cube["SEASON"] = cube["MONTH"].astype(int).map(SEASONS).astype("category")
+    for col in ["DISTRICT", "PROVINCE"]:
+        if col in cube:
+            cube[col] = cube[col].astype("category")
+    return cube
+
+
+@timed
+def load_cube(df: pd.DataFrame):
+    """Returns the cube for a dataset version, from memory, disk or a fresh build."""
+    key = fingerprint(df)
+    cube = cube_cache.get(key)
+    if cube is not None:
+        return cube
+
+    path = os.path.join(CUBE_CACHE_DIR, f"{key}.parquet")
+    if os.path.exists(path):
+        cube = pd.read_parquet(path)
+        # Marks it as recently used for pruning
+        os.utime(path)
+    else:
+        cube = build_cube(df)
+        try:
+            os.makedirs(CUBE_CACHE_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            cube.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+            prune_directory(
+                CUBE_CACHE_DIR, CUBE_DISK_MAX_BYTES, ".parquet", keep=[path]
+            )
+        except OSError:
+            pass
+    cube_cache.put(key, cube)
+    return cube
+
+
+def cube_measures(cube: pd.DataFrame):
+    return [col[: -len("_count")] for col in cube.columns if col.endswith("_count")]
+
+
+@timed
+def rollup(cube: pd.DataFrame, by: list, measures: list, stat="mean", **slices):
+    """Aggregates the cube to the given dimensions, optionally sliced first.
+
+    Slices are lists of values, or (first, last) tuples for YEAR ranges, e.g.
+    ``rollup(cube, ["PROVINCE", "YEAR"], ["T2M"], YEAR=(1990, 2000))``.
+    """
+    mask = pd.Series(True, index=cube.index)
+    for dim, values in slices.items():
+        if values is None:
+            continue
+        if isinstance(values, tuple):
+            mask &= cube[dim].between(*values)
+        else:
+            mask &= cube[dim].isin(values)
+    sliced = cube[mask]
+
+    grouped = sliced.groupby(by, observed=True) if by else sliced.groupby(lambda _: 0)
+    result = {}
+    for measure in measures:
+        if stat == "mean":
+            result[measure] = (
+                grouped[f"{measure}_sum"].sum() / grouped[f"{measure}_count"].sum()
+            )
+        elif stat in ("sum", "count"):
+            result[measure] = grouped[f"{measure}_{stat}"].sum()
+        else:
+            result[measure] = grouped[f"{measure}_{stat}"].agg(stat)
+    return pd.DataFrame(result)
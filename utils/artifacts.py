@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import threading
+
+from utils.cache import LRUCache, estimate_size, prune_directory
+
+ARTIFACT_STORE_DIR = os.environ.get("ARTIFACT_STORE_DIR", ".cache/artifacts")
+# Bound on the pickled artifacts kept on disk, least recently used are removed first
+ARTIFACT_STORE_MAX_BYTES = int(os.environ.get("ARTIFACT_STORE_MAX_MB", 2048)) << 20
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get("ARTIFACT_CACHE_MAX_MB", 512)) << 20
+# Bumped when the output of an operation changes for the same parameters
+ARTIFACT_FORMAT = 2
+
+
+def _canonical(value):
+    # Dict keys are ordered by repr, so mixed labels like "Series Name" and 2006
+    # can be ordered (sort_keys cannot) and 2006 stays distinct from "2006"
+    if isinstance(value, dict):
+        return [[repr(k), _canonical(value[k])] for k in sorted(value, key=repr)]
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def artifact_key(input_key, op, params):
+    """Returns the key of an operation's output from its input's key and parameters."""
+    spec = json.dumps([ARTIFACT_FORMAT, input_key, op, _canonical(params)], default=str)
+    return hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+
+class ArtifactStore:
+    """Content-addressed outputs of preprocessing steps, shared across sessions and restarts.
+
+    Outputs are pickled to disk under their key and the loaded objects are
+    shared by every session through a byte-bounded LRU cache. Callers must
+    treat them as read-only, like the datasets of the data loader.
+    """
+
+    def __init__(
+        self,
+        root=ARTIFACT_STORE_DIR,
+        max_disk_bytes=ARTIFACT_STORE_MAX_BYTES,
+        max_bytes=ARTIFACT_CACHE_MAX_BYTES,
+    ):
+        self.root = root
+        self.max_disk_bytes = max_disk_bytes
+        self.cache = LRUCache(max_bytes, name="artifacts")
+        # Lock and number of waiting sessions per key being computed, removed
+        # by the last one out so the dict only holds computations in progress
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.pkl")
+
+    def __contains__(self, key):
+        return key in self.cache or os.path.exists(self.path(key))
+
+    def get(self, key):
+        """Returns a stored artifact, or None if it was never stored or was evicted."""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # Marks it as recently used for pruning
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.cache.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Stores an artifact, in memory only when the disk cannot be written."""
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            # A read-only or full cache must never fail a step that was computed
+            print(f"Could not write artifact {key}: {e}", file=sys.stderr)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            self.cache.put(key, value)
+            return
+        self.cache.put(key, value, size=estimate_size(value) or os.path.getsize(path))
+        self.prune()
+
+    def get_or_compute(self, key, compute):
+        """Returns the artifact for a key, computing and storing it at most once at a time."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        # Sessions asking for the same output concurrently wait for one computation
+        try:
+            with entry[0]:
+                value = self.get(key)
+                if value is None:
+                    value = compute()
+                    self.put(key, value)
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+        return value
+
+    def prune(self):
+        """Removes the least recently used artifacts past the disk limit."""
+        prune_directory(self.root, self.max_disk_bytes, ".pkl")
+
+
+artifact_store = ArtifactStore()
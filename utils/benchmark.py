@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from utils.data_loader import (
+    SHAPEFILE_PATHS,
+    load_dataset,
+    load_geospatial_data,
+    load_tabular_data,
+    registry,
+)
+from utils.data_preprocessing import (
+    get_column_info,
+    get_missing_value_strategies,
+    handle_missing_values,
+    melt_dataframe,
+)
+from utils.figures import display_shape_file
+from utils.statistics import DatasetStatistics
+from utils.training import SINGLE_MODELS
+
+BENCHMARK_DIR = os.environ.get("BENCHMARK_DIR", ".cache/benchmarks")
+SCALES = [1, 10, 100]
+MISSING_FRACTION = 0.05
+FEATURES = ["YEAR", "MONTH", "PRECTOT", "RH2M", "PS", "WS10M"]
+TARGET = "T2M"
+
+
+def measure(fn, repeats):
+    """Returns timings over `repeats` runs and the peak traced memory of one more run."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds_min": min(timings),
+        "seconds_median": statistics.median(timings),
+        "peak_mb": peak / 2**20,
+        "repeats": repeats,
+    }
+
+
+def scale_monthly(df: pd.DataFrame, factor, seed=0):
+    """Returns `factor` copies of the monthly data as distinct, jittered districts."""
+    if factor == 1:
+        return df
+    rng = np.random.default_rng(seed)
+    copies = []
+    for i in range(factor):
+        copy = df.copy()
+        copy["DISTRICT"] = copy["DISTRICT"].astype(str) + f"_{i}"
+        measures = copy.select_dtypes(include="float").columns
+        copy[measures] = copy[measures] * rng.normal(1, 0.01, size=(len(copy), 1))
+        copies.append(copy)
+    scaled = pd.concat(copies, ignore_index=True)
+    scaled["DISTRICT"] = scaled["DISTRICT"].astype("category")
+    return scaled
+
+
+def scale_report(df: pd.DataFrame, factor):
+    """Returns `factor` copies of the report with distinct series names."""
+    if factor == 1:
+        return df
+    copies = [
+        df.assign(**{"Series Name": df["Series Name"] + f" #{i}"})
+        for i in range(factor)
+    ]
+    return pd.concat(copies, ignore_index=True)
+
+
+def with_missing(df: pd.DataFrame, fraction=MISSING_FRACTION, seed=0):
+    """Blanks a random fraction of the float measures, as real station data has."""
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    for col in df.select_dtypes(include="float").columns:
+        df.loc[rng.random(len(df)) < fraction, col] = np.nan
+    return df
+
+
+def _draw_shape(name, layer):
+    plt.close(display_shape_file(layer, name))
+
+
+def fixed_benchmarks():
+    """Benchmarks of the bundled sources, which have no scaled variant.
+
+    Loads start from an empty in-memory cache, so they read the columnar
+    cache when it has been built and parse the sources otherwise.
+    """
+
+    # Layers missing from a checkout are skipped rather than failing the run
+    layers = [name for name, path in SHAPEFILE_PATHS.items() if os.path.exists(path)]
+    for name in SHAPEFILE_PATHS.keys() - layers:
+        print(f"Skipping missing layer {name}", file=sys.stderr)
+
+    def load_geo():
+        registry.invalidate()
+        if len(layers) == len(SHAPEFILE_PATHS):
+            load_geospatial_data()
+        else:
+            for name in layers:
+                load_dataset(name)
+
+    def load_tabular():
+        registry.invalidate()
+        load_tabular_data()
+
+    yield "load_geospatial_data", load_geo
+    yield "load_tabular_data", load_tabular
+    for name in layers:
+        layer = load_dataset(name)
+        yield f"display_shape_file[{name}]", (
+            lambda name=name, layer=layer: _draw_shape(name, layer)
+        )
+
+
+def scaled_benchmarks(monthly, report):
+    """Benchmarks of the hot paths that grow with the number of rows."""
+    id_vars = ["Series Name", "Series Code"]
+    yield "melt_dataframe", lambda: melt_dataframe(report, id_vars, "Year", "Value")
+    yield "get_column_info", lambda: get_column_info(monthly)
+
+    missing = with_missing(monthly)
+    for strategy in get_missing_value_strategies(missing):
+        yield f"handle_missing_values[{strategy}]", (
+            lambda strategy=strategy: handle_missing_values(missing, strategy)
+        )
+
+    yield "describe", lambda: DatasetStatistics(monthly).describe()
+    yield "corr", lambda: DatasetStatistics(monthly).corr()
+
+    X, y = monthly[FEATURES], monthly[TARGET]
+    for name, make_model in SINGLE_MODELS.items():
+        fitted = make_model().fit(X, y)
+        yield f"fit[{name}]", lambda make_model=make_model: make_model().fit(X, y)
+        yield f"predict[{name}]", lambda fitted=fitted: fitted.predict(X)
+
+
+def run(scales=SCALES, repeats=3, only=None):
+    """Runs every benchmark and returns the results as a JSON-serializable dict."""
+    results = []
+
+    def record(name, fn, scale, rows):
+        if only and only not in name:
+            return
+        result = {"name": name, "scale": scale, "rows": rows, **measure(fn, repeats)}
+        results.append(result)
+        print(
+            f"{name:<60} x{scale:<4} {result['seconds_median'] * 1000:>10.1f} ms "
+            f"{result['peak_mb']:>9.1f} MB",
+            file=sys.stderr,
+        )
+
+    for name, fn in fixed_benchmarks():
+        record(name, fn, 1, None)
+
+    base_monthly = load_dataset("District Wise Monthly Climate")
+    base_report = load_dataset("Climate Development Report")
+    for scale in scales:
+        monthly = scale_monthly(base_monthly, scale)
+        report = scale_report(base_report, scale)
+        for name, fn in scaled_benchmarks(monthly, report):
+            rows = len(report) if name == "melt_dataframe" else len(monthly)
+            record(name, fn, scale, rows)
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+
+
+def compare(old_path, new_path):
+    """Prints the median time ratio of every benchmark present in both result files."""
+    with open(old_path) as f:
+        old = {(r["name"], r["scale"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {(r["name"], r["scale"]): r for r in json.load(f)["results"]}
+
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]["seconds_median"], new[key]["seconds_median"]
+        print(
+            f"{key[0]:<60} x{key[1]:<4} {before * 1000:>10.1f} ms -> "
+            f"{after * 1000:>10.1f} ms  ({after / before:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time and measure peak memory of the dashboard's hot paths."
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", help="Run only benchmarks whose name contains this")
+    parser.add_argument(
+        "--output", help="Result file, by default under .cache/benchmarks"
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Compare two result files instead of running",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    report = run(args.scales, args.repeats, args.only)
+    output = args.output or os.path.join(
+        BENCHMARK_DIR,
+        f"{report['timestamp'].replace(':', '')}_{report['commit']}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
@@ -0,0 +1,160 @@
+import os
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+_fingerprints = {}
+# Named caches, whose counters are attributed to page stages by utils.profiling
+_caches = weakref.WeakSet()
+
+
+def estimate_size(obj):
+    """Returns an approximate in-memory size of a cached object in bytes."""
+    if hasattr(obj, "memory_usage"):
+        size = int(obj.memory_usage(deep=True).sum())
+        geometry = getattr(obj, "geometry", None)
+        if geometry is not None and hasattr(geometry, "count_coordinates"):
+            # Shapely geometries are opaque to pandas, count their vertices instead
+            size += int(geometry.count_coordinates().sum()) * 16
+        return size
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    return 0
+
+
+def frame_digest(df: pd.DataFrame, row_hashes):
+    """Returns a hash of a frame's schema and the given per-row hashes."""
+    digest = hashlib.sha256()
+    digest.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+    digest.update(row_hashes.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def fingerprint(df: pd.DataFrame):
+    """Returns a content hash of a frame, memoized for as long as the frame is alive."""
+    key = id(df)
+    memo = _fingerprints.get(key)
+    if memo is not None and memo[0]() is df:
+        return memo[1]
+
+    value = frame_digest(df, pd.util.hash_pandas_object(df, index=True).values)
+
+    _fingerprints[key] = (
+        weakref.ref(df, lambda _, key=key: _fingerprints.pop(key, None)),
+        value,
+    )
+    return value
+
+
+class LRUCache:
+    """Thread-safe cache that evicts least recently used entries past a byte limit."""
+
+    def __init__(self, max_bytes, name=None):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        if name:
+            _caches.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total += size
+            # Always keep the newest entry, even if it alone exceeds the limit
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def values(self):
+        """Returns a snapshot of the cached values, most recently used last."""
+        with self._lock:
+            return [value for value, _ in self._entries.values()]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def stats(self):
+        """Returns hit/miss counters and current usage."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def cache_counters():
+    """Returns the hit and miss counters of every named cache."""
+    return {cache.name: (cache.hits, cache.misses) for cache in list(_caches)}
+
+
+def prune_directory(root, max_bytes, suffix, keep=()):
+    """Removes the least recently modified files under a directory past a byte limit.
+
+    Only files ending in `suffix` count, and the paths in `keep` are never
+    removed. Readers mark a file as used by touching it with os.utime.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(suffix):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
@@ -1,44 +1,357 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import threading
+from collections import defaultdict
+
+import pyarrow
 import pandas as pd
 import geopandas as gpd
 
+from utils.cache import LRUCache, estimate_size
+from utils.schema import read_monthly_climate
+from utils.profiling import timed
+from utils.workbook import index_workbook, read_sheet
 
-def load_geospatial_data():
-    shapefile_paths = {
-        "National Boundary": "data/national_boundary_shape_file/national_boundary.shp",
-        "Provincial Boundary": "data/provincial_boundary_shape_file/provincial_boundary.shp",
-        "District Boundary (SHP)": "data/district_boundary_shape_file/district_boundary.shp",
-        "River Line": "data/river_line_shape_file/river_line.shp",
-        "River Polygon": "data/river_polygon_shape_file/river_polygon.shp",
-        "District Boundary (GeoJSON)": "data/district.geojson",
-    }
+SHAPEFILE_PATHS = {
+    "National Boundary": "data/national_boundary_shape_file/national_boundary.shp",
+    "Provincial Boundary": "data/provincial_boundary_shape_file/provincial_boundary.shp",
+    "District Boundary (SHP)": "data/district_boundary_shape_file/district_boundary.shp",
+    "River Line": "data/river_line_shape_file/river_line.shp",
+    "River Polygon": "data/river_polygon_shape_file/river_polygon.shp",
+    "District Boundary (GeoJSON)": "data/district.geojson",
+}
 
-    geo_data = {name: gpd.read_file(path) for name, path in shapefile_paths.items()}
+TABULAR_PATHS = {
+    "District Wise Monthly Climate": "data/nepal_district_monthly_climate_data.csv",
+    "Climate Development Report": "data/Nepal_Climate_Development_Report.xlsx",
+}
 
-    # Harmonize CRS if applicable
-    if (
-        "District Boundary (GeoJSON)" in geo_data
-        and "District Boundary (SHP)" in geo_data
-    ):
-        geo_data["District Boundary (GeoJSON)"] = geo_data[
-            "District Boundary (GeoJSON)"
-        ].to_crs(geo_data["District Boundary (SHP)"].crs)
+# Excel sources, every sheet of which is a dataset of its own
+WORKBOOKS = ["Climate Development Report"]
 
-    return geo_data, shapefile_paths
+# Upper bound for datasets kept in memory, shared by every session of the process
+CACHE_MAX_BYTES = int(os.environ.get("DATA_CACHE_MAX_MB", 512)) * 1024 * 1024
 
+# Typed Parquet/GeoParquet copies of the sources, rebuilt when a source hash changes
+COLUMNAR_CACHE_DIR = os.environ.get("DATA_CACHE_DIR", ".cache/columnar")
 
-def load_tabular_data():
-    tabular_paths = {
-        "District Wise Monthly Climate": "data/nepal_district_monthly_climate_data.csv",
-        "Climate Development Report": "data/Nepal_Climate_Development_Report.xlsx",
+
+def source_files(path):
+    """Returns a source and its sidecar files (.dbf, .shx, ... for shapefiles)."""
+    stem, _ = os.path.splitext(path)
+    return sorted(glob.glob(glob.escape(stem) + ".*")) or [path]
+
+
+def source_mtime(path):
+    """Returns the latest modification time of a source and its sidecar files."""
+    return max(os.path.getmtime(f) for f in source_files(path))
+
+
+def source_hash(path):
+    """Returns a SHA-256 digest over the contents of a source and its sidecar files."""
+    digest = hashlib.sha256()
+    for file in source_files(path):
+        digest.update(os.path.basename(file).encode())
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class DatasetRegistry:
+    """Loads datasets on first request and keeps them in a process-wide LRU cache."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.cache = LRUCache(max_bytes, name="datasets")
+        self._paths = {}
+        self._loaders = {}
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def register(self, name, path, loader):
+        self._paths[name] = path
+        self._loaders[name] = loader
+
+    def names(self):
+        return list(self._paths)
+
+    def path(self, name):
+        return self._paths[name]
+
+    @timed
+    def get(self, name):
+        """Returns the dataset, reloading it if the source changed on disk."""
+        path = self._paths[name]
+        with self._locks_guard:
+            lock = self._locks[name]
+
+        # One loader per dataset at a time, so concurrent sessions share a single parse
+        with lock:
+            mtime = source_mtime(path)
+            cached = self.cache.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            data = self._loaders[name](path)
+            self.cache.put(name, (mtime, data), size=estimate_size(data))
+            return data
+
+    def invalidate(self, name=None):
+        if name is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(name)
+
+
+def _read_geospatial(path):
+    return gpd.read_file(path)
+
+
+def _read_district_geojson(path):
+    geo_df = gpd.read_file(path)
+
+    # Harmonize CRS with the district shapefile; reading zero rows is enough to get it
+    shp_path = SHAPEFILE_PATHS["District Boundary (SHP)"]
+    if os.path.exists(shp_path):
+        geo_df = geo_df.to_crs(gpd.read_file(shp_path, rows=0).crs)
+    return geo_df
+
+
+def _cache_base(name):
+    slug = "".join(c if c.isalnum() else "_" for c in name.lower()).strip("_")
+    return os.path.join(COLUMNAR_CACHE_DIR, slug)
+
+
+def _columnar_paths(name):
+    base = _cache_base(name)
+    return base + ".parquet", base + ".json"
+
+
+def _source_stamp(path):
+    return [[os.path.getmtime(f), os.path.getsize(f)] for f in source_files(path)]
+
+
+def _write_json(path, data):
+    # Written to a temporary file first, so readers never see a half-written file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_columnar(name, path, data):
+    """Writes a parsed dataset to the columnar cache along with its source hash."""
+    cache_path, meta_path = _columnar_paths(name)
+    os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+    # Parquet stores column labels as strings and integer dictionaries as plain
+    # integers, so keep what is needed to restore both exactly
+    meta = {
+        "hash": source_hash(path),
+        "stamp": _source_stamp(path),
+        "columns": data.columns.tolist(),
+        "categorical": data.select_dtypes(include="category").columns.tolist(),
+        "geo": isinstance(data, gpd.GeoDataFrame),
     }
+    # Serialized up front, a label JSON cannot hold fails before anything is written
+    json.dumps(meta)
+    tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        data.rename(columns=str).to_parquet(tmp)
+        # The old meta must not describe the new file if writing the new meta fails
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        os.replace(tmp, cache_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _write_json(meta_path, meta)
 
-    tabular_data = {
-        "District Wise Monthly Climate": pd.read_csv(
-            tabular_paths["District Wise Monthly Climate"]
-        ),
-        "Climate Development Report": pd.read_excel(
-            tabular_paths["Climate Development Report"]
+
+def read_columnar(name, path):
+    """Returns the cached dataset, or None if missing or built from another source version."""
+    cache_path, meta_path = _columnar_paths(name)
+    if not (os.path.exists(cache_path) and os.path.exists(meta_path)):
+        return None
+
+    # An unreadable meta file is a cache miss, the dataset is parsed and cached again
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        stamp, source = meta["stamp"], meta["hash"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    # Hashing is only needed when the cheap mtime/size stamp no longer matches
+    if stamp != _source_stamp(path):
+        if source != source_hash(path):
+            return None
+        meta["stamp"] = _source_stamp(path)
+        try:
+            _write_json(meta_path, meta)
+        except OSError:
+            pass
+
+    try:
+        if meta["geo"]:
+            data = gpd.read_parquet(cache_path, memory_map=True)
+        else:
+            data = pd.read_parquet(cache_path, memory_map=True)
+    except (OSError, ValueError, pyarrow.ArrowException):
+        return None
+
+    data.columns = meta["columns"]
+    restore = [col for col in meta["categorical"] if data[col].dtype != "category"]
+    if restore:
+        data = data.astype({col: "category" for col in restore})
+    return data
+
+
+def columnar_loader(name, reader):
+    """Wraps a source reader so it goes through the columnar cache first."""
+
+    def load(path):
+        data = read_columnar(name, path)
+        if data is not None:
+            return data
+
+        data = reader(path)
+        try:
+            write_columnar(name, path, data)
+        except (OSError, ValueError, TypeError, pyarrow.ArrowException) as e:
+            # An unwritable cache must never stop the dashboard from loading data
+            print(f"Could not write columnar cache for {name}: {e}", file=sys.stderr)
+        return data
+
+    return load
+
+
+def build_columnar_cache(names=None):
+    """Converts the given (default: all) sources to the columnar cache."""
+    for name in names or registry.names():
+        path = registry.path(name)
+        if not os.path.exists(path):
+            print(f"Skipping {name}: {path} not found", file=sys.stderr)
+            continue
+        registry.invalidate(name)
+        cache_path, _ = _columnar_paths(name)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        registry.get(name)
+        print(f"Cached {name} -> {cache_path}")
+
+
+registry = DatasetRegistry()
+
+for _name, _path in SHAPEFILE_PATHS.items():
+    registry.register(
+        _name,
+        _path,
+        columnar_loader(
+            _name,
+            (
+                _read_district_geojson
+                if _name == "District Boundary (GeoJSON)"
+                else _read_geospatial
+            ),
         ),
-    }
+    )
+registry.register(
+    "District Wise Monthly Climate",
+    TABULAR_PATHS["District Wise Monthly Climate"],
+    columnar_loader("District Wise Monthly Climate", read_monthly_climate),
+)
+
+
+def workbook_sheets(name):
+    """Returns the sheet index of a workbook source, rebuilt only when the file changes."""
+    path = TABULAR_PATHS[name]
+    index_path = _cache_base(name) + ".sheets.json"
+    stamp = _source_stamp(path)
+    try:
+        with open(index_path) as f:
+            cached = json.load(f)
+        if cached["stamp"] == stamp:
+            return cached["sheets"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sheets = index_workbook(path)
+    try:
+        os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+        with open(index_path, "w") as f:
+            json.dump({"stamp": stamp, "sheets": sheets}, f, default=str)
+    except OSError as e:
+        print(f"Could not write the sheet index of {name}: {e}", file=sys.stderr)
+    return sheets
+
+
+def _sheet_reader(entry):
+    def read(path):
+        return read_sheet(path, entry)
+
+    return read
+
+
+# Dataset name -> (source path, sheet index entry). The first sheet keeps the
+# workbook's name, the others are named after their sheet.
+SHEET_DATASETS = {}
+for _workbook in WORKBOOKS:
+    _path = TABULAR_PATHS[_workbook]
+    _sheets = workbook_sheets(_workbook) if os.path.exists(_path) else []
+    for _i, _entry in enumerate(_sheets):
+        _name = _workbook if _i == 0 else f"{_workbook} · {_entry['sheet']}"
+        SHEET_DATASETS[_name] = (_path, _entry)
+        registry.register(_name, _path, columnar_loader(_name, _sheet_reader(_entry)))
+    if not _sheets:
+        # Registered anyway, so a missing workbook fails with the usual error on load
+        registry.register(_workbook, _path, columnar_loader(_workbook, pd.read_excel))
+
+TABULAR_DATASETS = [name for name in TABULAR_PATHS if name not in WORKBOOKS] + list(
+    SHEET_DATASETS or WORKBOOKS
+)
+
+
+def load_dataset(name):
+    """Returns a single dataset by name, loading it lazily."""
+    return registry.get(name)
+
+
+def load_geospatial_data():
+    geo_data = {name: registry.get(name) for name in SHAPEFILE_PATHS}
+    return geo_data, SHAPEFILE_PATHS
+
+
+def load_sheet(name, columns=None, rows=None):
+    """Returns a workbook sheet, optionally only some columns and a (first, last) row range.
+
+    A sheet that is already loaded is sliced, otherwise only the requested
+    cells are read from the workbook.
+    """
+    if columns is None and rows is None:
+        return registry.get(name)
+
+    path, entry = SHEET_DATASETS[name]
+    cached = registry.cache.get(name)
+    if cached is not None and cached[0] == source_mtime(path):
+        data = cached[1]
+        if columns is not None:
+            data = data[columns]
+        if rows is not None:
+            data = data.iloc[rows[0] : rows[1] + 1].reset_index(drop=True)
+        return data
+    return read_sheet(path, entry, columns, rows)
+
+
+def load_tabular_data():
+    return {name: registry.get(name) for name in TABULAR_DATASETS}
+
 
-    return tabular_data
+if __name__ == "__main__":
+    build_columnar_cache(sys.argv[1:])
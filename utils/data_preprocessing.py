@@ -1,14 +1,40 @@
+import weakref
+
+import numpy as np
 import pandas as pd
 
+from utils.dtypes import convert_columns
+from utils.reshape import melt_wide, pivot_long
+
+# Column info computed while a frame was built, kept for as long as the frame is alive
+_column_info = {}
+
 
 def get_shape(df: pd.DataFrame):
     """Returns shape as a formatted string."""
     return f"{df.shape[0]} rows × {df.shape[1]} columns"
 
 
+def remember_column_info(df: pd.DataFrame, info):
+    key = id(df)
+    _column_info[key] = (
+        weakref.ref(df, lambda _, key=key: _column_info.pop(key, None)),
+        info,
+    )
+
+
 def get_column_info(df: pd.DataFrame):
     """Returns column data types and missing values."""
-    dtypes = df.dtypes.rename("Type").reset_index().rename(columns={"index": "Column"})
+    memo = _column_info.get(id(df))
+    if memo is not None and memo[0]() is df:
+        return memo[1]
+
+    dtypes = (
+        df.dtypes.astype(str)
+        .rename("Type")
+        .reset_index()
+        .rename(columns={"index": "Column"})
+    )
     missing = (
         df.isna()
         .sum()
@@ -24,12 +50,166 @@ def get_meltable_columns(df: pd.DataFrame, id_vars: list):
     return [col for col in df.columns if col not in id_vars]
 
 
-def melt_dataframe(df: pd.DataFrame, id_vars: list, var_name: str, value_name: str):
-    """Melts the dataframe into long format."""
-    return pd.melt(
-        df,
-        id_vars=id_vars,
-        value_vars=get_meltable_columns(df, id_vars),
-        var_name=var_name,
-        value_name=value_name,
+def melt_dataframe(
+    df: pd.DataFrame,
+    id_vars: list,
+    var_name: str,
+    value_name: str,
+    var_type: str = "Auto-detect",
+):
+    """Melts the dataframe into long format with a parsed or categorical variable column."""
+    long, info = melt_wide(df, id_vars, var_name, value_name, var_type)
+    # The reshape already knows the long frame's column info, skip the rescan
+    remember_column_info(long, info)
+    return long
+
+
+def pivot_dataframe(df: pd.DataFrame, index: list, columns: str, values: str):
+    """Pivots a long dataframe back to wide format."""
+    return pivot_long(df, index, columns, values)
+
+
+MISSING_VALUE_STRATEGIES = [
+    "Drop rows",
+    "Drop columns",
+    "Fill with mean",
+    "Fill with median",
+    "Fill with mode",
+]
+
+# Strategies that work within each district, with the columns they need
+GROUPED_MISSING_VALUE_STRATEGIES = {
+    "Fill with district mean": ["DISTRICT"],
+    "Fill with district-month climatology": ["DISTRICT", "MONTH"],
+    "Interpolate over time per district": ["DISTRICT", "DATE"],
+    "Forward fill per district": ["DISTRICT", "DATE"],
+}
+
+
+def get_missing_value_strategies(df: pd.DataFrame):
+    """Returns the strategies whose required columns exist in the dataframe."""
+    return MISSING_VALUE_STRATEGIES + [
+        strategy
+        for strategy, columns in GROUPED_MISSING_VALUE_STRATEGIES.items()
+        if all(col in df.columns for col in columns)
+    ]
+
+
+def _fill_columns(df: pd.DataFrame, columns: list, values: np.ndarray):
+    """Fills only the missing cells of the columns, keeping their dtypes."""
+    filled = {}
+    for i, col in enumerate(columns):
+        original = df[col].to_numpy(dtype="float64", na_value=np.nan)
+        merged = np.where(np.isnan(original), values[:, i], original)
+        dtype = df[col].dtype
+        # A fractional mean does not fit an integer column, it becomes a float one
+        if pd.api.types.is_integer_dtype(dtype) and not np.all(
+            np.isnan(merged) | (merged % 1 == 0)
+        ):
+            dtype = (
+                "Float64" if pd.api.types.is_extension_array_dtype(dtype) else "float64"
+            )
+        filled[col] = pd.Series(merged, index=df.index).astype(dtype)
+    # Set one by one, assign only takes string labels and pivoted columns are years
+    out = df.copy()
+    for col, values in filled.items():
+        out[col] = values
+    return out
+
+
+def _time_ordered(df: pd.DataFrame, group_col: str, time_col: str):
+    """Returns row positions sorted by group then time, and the sorted group codes."""
+    times = df[time_col]
+    # Text dates (object or str dtype) would otherwise be ordered as text
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        times = pd.to_datetime(times, format="mixed")
+    codes = pd.factorize(df[group_col])[0]
+    order = np.lexsort((times.to_numpy(), codes))
+    return order, codes[order], times.to_numpy()[order]
+
+
+def _interpolate_by_group(values, codes, times):
+    """Linear interpolation in time between the nearest valid rows of the same group."""
+    rows = np.arange(len(values), dtype="float64")[:, None]
+    valid = ~np.isnan(values)
+    positions = pd.DataFrame(np.where(valid, rows, np.nan))
+    prev = positions.groupby(codes).ffill().to_numpy()
+    nxt = positions.groupby(codes).bfill().to_numpy()
+
+    inside = ~valid & ~np.isnan(prev) & ~np.isnan(nxt)
+    prev_idx = np.where(inside, prev, 0).astype(int)
+    next_idx = np.where(inside, nxt, 0).astype(int)
+    columns = np.arange(values.shape[1])[None, :]
+
+    t = times.astype("datetime64[ns]").view("int64").astype("float64")[:, None]
+    t = np.broadcast_to(t, values.shape)
+    span = t[next_idx, columns] - t[prev_idx, columns]
+    weight = np.divide(
+        t - t[prev_idx, columns], span, out=np.zeros(values.shape), where=span != 0
     )
+    y_prev, y_next = values[prev_idx, columns], values[next_idx, columns]
+    return np.where(inside, y_prev + (y_next - y_prev) * weight, values)
+
+
+def _fill_grouped(df: pd.DataFrame, strategy: str):
+    group_cols = GROUPED_MISSING_VALUE_STRATEGIES[strategy]
+    columns = [
+        col
+        for col in df.select_dtypes(include="number").columns
+        if col not in group_cols and df[col].hasnans
+    ]
+    if not columns:
+        return df
+
+    if strategy in ("Fill with district mean", "Fill with district-month climatology"):
+        # One groupby pass computes the group means of every column at once
+        means = df.groupby(group_cols, observed=True, sort=False)[columns].transform(
+            "mean"
+        )
+        return _fill_columns(df, columns, means.to_numpy(dtype="float64"))
+
+    group_col, time_col = group_cols
+    order, codes, times = _time_ordered(df, group_col, time_col)
+    values = df[columns].to_numpy(dtype="float64", na_value=np.nan)[order]
+
+    if strategy == "Interpolate over time per district":
+        filled = _interpolate_by_group(values, codes, times)
+    else:
+        filled = pd.DataFrame(values).groupby(codes).ffill().to_numpy()
+    # Rows without a district are left as they are
+    filled = np.where((codes < 0)[:, None], values, filled)
+
+    unsorted = np.empty_like(filled)
+    unsorted[order] = filled
+    return _fill_columns(df, columns, unsorted)
+
+
+def handle_missing_values(df: pd.DataFrame, strategy: str):
+    """Drops or fills missing values with the given strategy."""
+    if strategy in GROUPED_MISSING_VALUE_STRATEGIES:
+        return _fill_grouped(df, strategy)
+    if strategy == "Drop rows":
+        return df.dropna()
+    if strategy == "Drop columns":
+        return df.dropna(axis=1)
+
+    # Statistics are only needed for the columns that actually have gaps
+    missing = df.columns[df.isna().any()]
+    if strategy in ("Fill with mean", "Fill with median"):
+        columns = df[missing].select_dtypes(include="number").columns.tolist()
+        stats = df[columns].agg("mean" if strategy == "Fill with mean" else "median")
+        # Filled like the grouped strategies, a fractional fill turns integers to floats
+        return _fill_columns(df, columns, stats.to_numpy(dtype="float64")[None, :])
+    if strategy == "Fill with mode":
+        return df.fillna(df[missing].mode().iloc[0] if len(missing) else {})
+    raise ValueError(f"Unknown missing value strategy: {strategy}")
+
+
+def convert_dtypes(df: pd.DataFrame, new_types: dict):
+    """Casts columns to the given data types, only those that change."""
+    out, failures = convert_columns(df, new_types)
+    if failures:
+        raise ValueError(
+            "; ".join(f"{col} → {new_types[col]}: {e}" for col, e in failures.items())
+        )
+    return out
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache, fingerprint
+from utils.profiling import timed
+
+DOWNSAMPLE_METHODS = ["LTTB", "Min-max"]
+
+# Sort orders per dataset version and x column, reused by every plot of that column
+sort_cache = LRUCache(
+    int(os.environ.get("SORT_CACHE_MAX_MB", 64)) << 20, name="sort orders"
+)
+
+
+def sort_index(df: pd.DataFrame, column):
+    """Returns the stable sort order of a column, computed once per dataset version."""
+    key = (fingerprint(df), column)
+    order = sort_cache.get(key)
+    if order is None:
+        # pandas orders mixed text and missing values, missing last
+        values = df[column].reset_index(drop=True)
+        order = values.sort_values(kind="stable", na_position="last").index.to_numpy()
+        sort_cache.put(key, order, size=order.nbytes)
+    return order
+
+
+def _numeric(values):
+    # Datetimes as nanoseconds, anything non-numeric by its position in the sort order
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[ns]").view("int64").astype("float64")
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype="float64", na_value=np.nan)
+    return np.arange(len(values), dtype="float64")
+
+
+def lttb(x, y, n_out):
+    """Returns the positions kept by Largest-Triangle-Three-Buckets.
+
+    x must be sorted. Each bucket keeps the point forming the largest
+    triangle with the previously kept point and the next bucket's mean,
+    which preserves peaks and the overall shape of the line.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (end, edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x, y, n_out):
+    """Returns the positions of the minimum and maximum of each of n_out / 2 buckets.
+
+    x must be sorted. Fully vectorized, and keeps every extreme value, so the
+    drawn envelope matches the full series at the plot's resolution.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    # Equal buckets as rows of a NaN-padded matrix, so the extremes are one reduction
+    size = -(-n // (n_out // 2))
+    padded = np.full(-(-n // size) * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(-1, size)
+    offsets = np.arange(len(buckets)) * size
+    lows = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1)
+    highs = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1)
+    return np.unique(np.r_[0, offsets + lows, offsets + highs, n - 1])
+
+
+@timed
+def downsample(df: pd.DataFrame, x_col, y_col, n_out, method="LTTB", group=None):
+    """Returns the rows of the sorted series reduced to about n_out points per line.
+
+    With a group column each group is its own line and is reduced separately.
+    The result size depends on n_out (and the number of groups) only.
+    """
+    order = sort_index(df, x_col)
+    # The same column may be picked for both axes or the grouping
+    columns = list(dict.fromkeys(c for c in (x_col, y_col, group) if c))
+    data = df[columns].iloc[order]
+    data = data[data[y_col].notna()]
+    reduce = lttb if method == "LTTB" else minmax
+
+    parts = data.groupby(group, observed=True, sort=False) if group else [(None, data)]
+    kept = []
+    for _, part in parts:
+        x = _numeric(part[x_col])
+        y = part[y_col].to_numpy(dtype="float64")
+        kept.append(part.iloc[reduce(x, y, n_out)])
+    return pd.concat(kept) if kept else data
+
+
+def downsample_columns(df: pd.DataFrame, columns, n_out):
+    """Reduces a frame plotted against its index, keeping every column's extremes."""
+    x = np.arange(len(df), dtype="float64")
+    positions = [
+        minmax(x, df[col].to_numpy(dtype="float64", na_value=np.nan), n_out)
+        for col in columns
+    ]
+    return df.iloc[np.unique(np.concatenate(positions))]
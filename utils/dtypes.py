@@ -0,0 +1,182 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.reshape import parse_dates
+
+# Non-missing values sampled per column to infer its type and pre-check a conversion
+DTYPE_SAMPLE_ROWS = int(os.environ.get("DTYPE_SAMPLE_ROWS", 2000))
+# Text columns with at most this share of distinct values are suggested as categories
+CATEGORY_MAX_RATIO = 0.5
+
+DTYPE_OPTIONS = [
+    "str",
+    "category",
+    "boolean",
+    "int8",
+    "int16",
+    "int32",
+    "int64",
+    "Int8",
+    "Int16",
+    "Int32",
+    "Int64",
+    "float32",
+    "float64",
+    "Float64",
+    "datetime64[ns]",
+    "timedelta64[ns]",
+    "object",
+]
+
+_TRUE = {"true", "yes", "y", "1"}
+_FALSE = {"false", "no", "n", "0"}
+
+
+def _is_text(series: pd.Series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _sample(series: pd.Series, rows=DTYPE_SAMPLE_ROWS):
+    # Evenly spaced non-missing values, the same ones on every rerun
+    values = series.dropna()
+    if len(values) > rows:
+        values = values.iloc[np.linspace(0, len(values) - 1, rows).astype(int)]
+    return values
+
+
+def _smallest_int(low, high, nullable):
+    for bits in (8, 16, 32, 64):
+        info = np.iinfo(f"int{bits}")
+        if info.min <= low and high <= info.max:
+            return f"Int{bits}" if nullable else f"int{bits}"
+    return "float64"
+
+
+def infer_dtype(series: pd.Series):
+    """Returns the most compact type that holds a column's values without loss.
+
+    Integer-valued numbers get the smallest integer type, nullable when the
+    column has gaps. Text is tried as numbers, booleans and dates on a sample,
+    and repetitive text becomes a categorical.
+    """
+    current = str(series.dtype)
+    if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(
+        series
+    ):
+        return current
+    values = series.dropna()
+    if values.empty:
+        return current
+
+    if pd.api.types.is_numeric_dtype(series):
+        if pd.api.types.is_float_dtype(series) and not (values % 1 == 0).all():
+            return current
+        return _smallest_int(values.min(), values.max(), len(values) < len(series))
+    if not _is_text(series):
+        return current
+
+    sample = _sample(series)
+    numbers = pd.to_numeric(sample, errors="coerce")
+    if numbers.notna().all():
+        return "Int64" if (numbers % 1 == 0).all() else "Float64"
+    words = set(sample.astype(str).str.strip().str.lower())
+    if words <= _TRUE | _FALSE:
+        return "boolean"
+    # Only text naming a year, month names alone would land in year 0001
+    if parse_dates(sample).notna().all():
+        return "datetime64[ns]"
+    if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+        return "category"
+    return current
+
+
+def infer_dtypes(df: pd.DataFrame):
+    """Returns the suggested type of every column."""
+    return {col: infer_dtype(df[col]) for col in df.columns}
+
+
+def _to_boolean(series: pd.Series):
+    words = series.astype(str).str.strip().str.lower()
+    unknown = series.notna() & ~words.isin(_TRUE | _FALSE)
+    if unknown.any():
+        raise ValueError(f"not a yes/no value: {series[unknown].iloc[0]!r}")
+    return words.isin(_TRUE).astype("boolean").mask(series.isna())
+
+
+def convert_series(series: pd.Series, dtype: str):
+    """Converts one column, raising ValueError when a value does not fit the type."""
+    kind = pd.api.types.pandas_dtype(dtype) if dtype != "str" else None
+    if kind is not None and pd.api.types.is_bool_dtype(kind) and _is_text(series):
+        return _to_boolean(series)
+    if kind is not None and pd.api.types.is_numeric_dtype(kind):
+        numbers = series
+        if _is_text(series):
+            numbers = pd.to_numeric(series, errors="raise")
+        if pd.api.types.is_integer_dtype(kind):
+            values = numbers.dropna()
+            if not (values % 1 == 0).all():
+                raise ValueError("has fractional values")
+            if not values.empty:
+                info = np.iinfo(getattr(kind, "numpy_dtype", kind))
+                if values.min() < info.min or values.max() > info.max:
+                    raise ValueError(f"values outside {info.min}..{info.max}")
+        return numbers.astype(dtype)
+    if kind is not None and pd.api.types.is_datetime64_dtype(kind) and _is_text(series):
+        dates = pd.Series(parse_dates(series), index=series.index)
+        bad = series.notna() & dates.isna()
+        if bad.any():
+            raise ValueError(f"not a date with a year: {series[bad].iloc[0]!r}")
+        return dates.astype(dtype)
+    if (
+        kind is not None
+        and pd.api.types.is_timedelta64_dtype(kind)
+        and _is_text(series)
+    ):
+        return pd.to_timedelta(series).astype(dtype)
+    return series.astype(dtype)
+
+
+def check_conversions(df: pd.DataFrame, new_types: dict):
+    """Tries each conversion on a sample of its column and returns {column: error}."""
+    failures = {}
+    for col, dtype in new_types.items():
+        kind = pd.api.types.pandas_dtype(dtype) if dtype != "str" else None
+        if isinstance(kind, np.dtype) and kind.kind in "iub" and df[col].isna().any():
+            nullable = "boolean" if kind.kind == "b" else kind.name.capitalize()
+            failures[col] = (
+                f"has missing values, use a nullable type like "
+                f"{nullable.replace('Uint', 'UInt')}"
+            )
+            continue
+        try:
+            convert_series(_sample(df[col]), dtype)
+        except (ValueError, TypeError, OverflowError) as e:
+            failures[col] = str(e)
+    return failures
+
+
+def convert_columns(df: pd.DataFrame, new_types: dict):
+    """Converts the columns whose type changes and returns (frame, {column: error}).
+
+    Each column is checked on a sample before its full conversion, and a
+    column that fails either is left as it was without undoing the others.
+    """
+    changed = {
+        col: dtype for col, dtype in new_types.items() if str(df[col].dtype) != dtype
+    }
+    failures = check_conversions(df, changed)
+    converted = {}
+    for col, dtype in changed.items():
+        if col in failures:
+            continue
+        try:
+            converted[col] = convert_series(df[col], dtype)
+        except (ValueError, TypeError, OverflowError) as e:
+            failures[col] = str(e)
+    # Unchanged columns are shared with the input
+    out = df.copy()
+    for col, values in converted.items():
+        out[col] = values
+    return out, failures
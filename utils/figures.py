@@ -1,4 +1,44 @@
+import io
+import os
+
 import matplotlib.pyplot as plt
+import seaborn as sns
+
+from utils.cache import LRUCache, fingerprint
+from utils.data_loader import SHAPEFILE_PATHS, source_mtime
+from utils.downsample import downsample
+from utils.geometry import level_of_detail
+from utils.statistics import dataset_statistics
+from utils.profiling import timed
+
+# Rendered figures shared by every session, bounded by their encoded size
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_MB", 64)) * 1024 * 1024
+FIGURE_DPI = 150
+
+figure_cache = LRUCache(FIGURE_CACHE_MAX_BYTES, name="figures")
+
+
+@timed
+def render_figure(key, draw, fmt="png"):
+    """Returns the encoded figure for a key, drawing and closing it only on a cache miss."""
+    key = (*key, fmt, FIGURE_DPI)
+    data = figure_cache.get(key)
+    if data is not None:
+        return data
+
+    fig = draw()
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=FIGURE_DPI, bbox_inches="tight")
+    finally:
+        # Figures left open are kept alive by pyplot and grow the server's memory
+        plt.close(fig)
+
+    data = buffer.getvalue()
+    if fmt == "svg":
+        data = data.decode()
+    figure_cache.put(key, data, size=len(data))
+    return data
 
 
 def display_shape_file(file, label):
@@ -23,3 +63,77 @@ def display_shape_file(file, label):
     fig.patch.set_facecolor("none")
 
     return fig
+
+
+def histogram_image(df, column):
+    def draw():
+        fig, ax = plt.subplots()
+        sns.histplot(df[column].dropna(), kde=True, ax=ax)
+        return fig
+
+    return render_figure((fingerprint(df), "histogram", column), draw)
+
+
+def line_plot_image(df, time_col, value_col, group=None, method="LTTB"):
+    def draw():
+        fig, ax = plt.subplots()
+        # No more points per line than the figure has pixels across
+        points = int(fig.get_figwidth() * FIGURE_DPI)
+        df_sorted = downsample(df, time_col, value_col, points, method, group)
+        if group:
+            for _, part in df_sorted.groupby(group, observed=True):
+                ax.plot(part[time_col], part[value_col], linewidth=0.8)
+        else:
+            ax.plot(df_sorted[time_col], df_sorted[value_col])
+        ax.set_xlabel(time_col)
+        ax.set_ylabel(value_col)
+        ax.set_title(f"{value_col} over {time_col}")
+        plt.xticks(rotation=45)
+        return fig
+
+    return render_figure(
+        (fingerprint(df), "line", time_col, value_col, group, method), draw
+    )
+
+
+def box_plot_image(df, column):
+    def draw():
+        fig, ax = plt.subplots()
+        sns.boxplot(y=df[column], ax=ax)
+        return fig
+
+    return render_figure((fingerprint(df), "box", column), draw)
+
+
+def correlation_heatmap_image(df, columns):
+    def draw():
+        fig, ax = plt.subplots(figsize=(10, 6))
+        corr = dataset_statistics(df).corr().loc[columns, columns]
+        sns.heatmap(corr, annot=True, cmap="coolwarm", ax=ax)
+        return fig
+
+    return render_figure((fingerprint(df), "heatmap", tuple(columns)), draw)
+
+
+def choropleth_image(values, layer_name, key_column, title):
+    """Returns a map layer coloured by values indexed like the layer's key column."""
+
+    def draw():
+        figsize = (8, 6)
+        layer = level_of_detail(layer_name, figsize[0] * FIGURE_DPI)
+        fig, ax = plt.subplots(figsize=figsize)
+        layer.assign(value=layer[key_column].map(values)).plot(
+            column="value",
+            ax=ax,
+            cmap="coolwarm",
+            legend=True,
+            edgecolor="white",
+            missing_kwds={"color": "lightgrey"},
+        )
+        ax.set_title(title)
+        ax.set_axis_off()
+        return fig
+
+    version = source_mtime(SHAPEFILE_PATHS[layer_name])
+    key = tuple(values.round(6).items())
+    return render_figure(("choropleth", layer_name, version, title, key), draw)
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, r2_score, root_mean_squared_error
+
+FORECAST_TARGETS = ["T2M", "PRECTOT"]
+FORECAST_LAGS = (1, 2, 3, 6, 12, 24)
+ROLLING_WINDOWS = (3, 6, 12)
+
+
+def can_forecast(df: pd.DataFrame):
+    return {"DISTRICT", "YEAR", "MONTH"} <= set(df.columns)
+
+
+def month_index(df: pd.DataFrame):
+    """Returns a running month number, consecutive across year boundaries."""
+    return df["YEAR"].astype("int32") * 12 + df["MONTH"].astype("int32") - 1
+
+
+def make_features(df: pd.DataFrame, target, horizon=1, exog=()):
+    """Builds lag, rolling-window and seasonal features for every district at once.
+
+    Each series is laid out as one column of a (month x district) matrix, so a
+    lag or rolling window is a single shift over all districts. Missing months
+    become gaps instead of silently shifting neighbours together. Only values
+    at least `horizon` months old are used, so each row is a direct forecast
+    made `horizon` months ahead.
+    """
+    frame = df.assign(PERIOD=month_index(df))
+    first, last = frame["PERIOD"].min(), frame["PERIOD"].max()
+    periods = pd.RangeIndex(first, last + horizon + 1, name="PERIOD")
+
+    features = {}
+    for col in [target, *exog]:
+        wide = frame.pivot_table(
+            index="PERIOD", columns="DISTRICT", values=col, observed=True
+        ).reindex(periods)
+        known = wide.shift(horizon)
+        for lag in FORECAST_LAGS:
+            if lag >= horizon:
+                features[f"{col}_lag{lag}"] = wide.shift(lag)
+        for window in ROLLING_WINDOWS:
+            features[f"{col}_mean{window}"] = known.rolling(window).mean()
+        if col == target:
+            features[f"{col}_std12"] = known.rolling(12).std()
+            features[target] = wide
+
+    long = pd.concat(
+        {name: wide.stack(future_stack=True) for name, wide in features.items()},
+        axis=1,
+    ).reset_index()
+    long["DISTRICT"] = long["DISTRICT"].astype("category")
+
+    # Seasonality as a point on the unit circle, so December sits next to January
+    month = long["PERIOD"] % 12
+    long["MONTH_SIN"] = np.sin(2 * np.pi * month / 12)
+    long["MONTH_COS"] = np.cos(2 * np.pi * month / 12)
+    long["YEAR"] = long["PERIOD"] // 12
+    long["MONTH"] = month + 1
+    return long
+
+
+def feature_columns(features: pd.DataFrame, target):
+    return [
+        col
+        for col in features.columns
+        if col not in (target, "PERIOD", "DISTRICT", "YEAR", "MONTH")
+    ]
+
+
+def rolling_origin_splits(periods, n_splits=3, test_months=12):
+    """Yields (train mask, test mask) pairs with the forecast origin moving forward.
+
+    Every split trains on all months before its origin and tests on the
+    `test_months` that follow, so no fold sees its own future.
+    """
+    periods = np.asarray(periods)
+    last = periods.max()
+    for i in range(n_splits, 0, -1):
+        origin = last + 1 - i * test_months
+        yield periods < origin, (periods >= origin) & (periods < origin + test_months)
+
+
+class BatchedRidge:
+    """Ridge regression fitted separately per group, solved as one batched system.
+
+    Normal equations for every group are accumulated from the rows sorted by
+    group and solved together by one batched `np.linalg.solve`, instead of
+    one estimator per district. Groups unseen in training are predicted by
+    a pooled fit over all groups, whose normal equations are their sum.
+    """
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def _design(self, X):
+        X = np.asarray(X, dtype="float64")
+        X = (X - self.mean_) / self.scale_
+        return np.column_stack([X, np.ones(len(X))])
+
+    def fit(self, X, y, groups):
+        X = np.asarray(X, dtype="float64")
+        self.mean_ = X.mean(axis=0)
+        self.scale_ = X.std(axis=0)
+        self.scale_[self.scale_ == 0] = 1
+        self.groups_, codes = np.unique(np.asarray(groups), return_inverse=True)
+
+        # Contiguous rows per group, so each group is one (n_g x k) product
+        order = np.argsort(codes, kind="stable")
+        A = self._design(X)[order]
+        y = np.asarray(y, dtype="float64")[order]
+        bounds = np.searchsorted(codes[order], np.arange(len(self.groups_) + 1))
+        k = A.shape[1]
+        xtx = np.empty((len(self.groups_) + 1, k, k))
+        xty = np.empty((len(self.groups_) + 1, k))
+        for g, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            xtx[g] = A[start:stop].T @ A[start:stop]
+            xty[g] = A[start:stop].T @ y[start:stop]
+        xtx[-1] = xtx[:-1].sum(axis=0)
+        xty[-1] = xty[:-1].sum(axis=0)
+
+        # The intercept is left unpenalized
+        penalty = np.eye(k) * self.alpha
+        penalty[-1, -1] = 0
+        coef = np.linalg.solve(xtx + penalty, xty[:, :, None])[:, :, 0]
+        self.coef_, self.pooled_coef_ = coef[:-1], coef[-1]
+        return self
+
+    def predict(self, X, groups):
+        groups = np.asarray(groups)
+        codes = np.searchsorted(self.groups_, groups)
+        codes = np.clip(codes, 0, len(self.groups_) - 1)
+        known = self.groups_[codes] == groups
+        coef = np.where(known[:, None], self.coef_[codes], self.pooled_coef_)
+        return np.einsum("nk,nk->n", self._design(X), coef)
+
+
+class GlobalBoosting:
+    """One gradient-boosted model for all districts, the district as a categorical feature."""
+
+    def __init__(self, **params):
+        self.model = HistGradientBoostingRegressor(
+            categorical_features=[0], random_state=42, **params
+        )
+
+    def _design(self, X, groups):
+        codes = pd.Categorical(np.asarray(groups), categories=self.groups_).codes
+        return np.column_stack([codes, np.asarray(X, dtype="float64")])
+
+    def fit(self, X, y, groups):
+        self.groups_ = np.unique(np.asarray(groups))
+        self.model.fit(self._design(X, groups), y)
+        return self
+
+    def predict(self, X, groups):
+        return self.model.predict(self._design(X, groups))
+
+
+class SeasonalNaive:
+    """Baseline repeating the value from the same month one year earlier."""
+
+    def __init__(self, column):
+        self.column = column
+
+    def fit(self, X, y, groups):
+        return self
+
+    def predict(self, X, groups):
+        return X[self.column].to_numpy(dtype="float64")
+
+
+FORECAST_MODELS = {
+    "Per-district ridge": lambda target: BatchedRidge(alpha=1.0),
+    "Global gradient boosting": lambda target: GlobalBoosting(max_iter=300),
+    "Seasonal naive": lambda target: SeasonalNaive(f"{target}_lag12"),
+}
+
+
+def _fit_predict(model, train, test, columns, target):
+    model.fit(train[columns], train[target].to_numpy(), train["DISTRICT"])
+    return model.predict(test[columns], test["DISTRICT"])
+
+
+def backtest(df, target, model_name, horizon=1, n_splits=3, test_months=12):
+    """Scores a model over rolling-origin splits.
+
+    Returns per-split metrics and the out-of-sample predictions of all splits.
+    """
+    features = make_features(df, target, horizon)
+    columns = feature_columns(features, target)
+    features = features.dropna(subset=[target, *columns])
+
+    scores, predictions = [], []
+    splits = rolling_origin_splits(features["PERIOD"], n_splits, test_months)
+    for split, (train_mask, test_mask) in enumerate(splits, start=1):
+        train, test = features[train_mask], features[test_mask]
+        model = FORECAST_MODELS[model_name](target)
+        y_pred = _fit_predict(model, train, test, columns, target)
+        y_true = test[target].to_numpy()
+        scores.append(
+            {
+                "split": split,
+                "train_until": train["PERIOD"].max(),
+                "test_rows": len(test),
+                "r2": r2_score(y_true, y_pred),
+                "rmse": root_mean_squared_error(y_true, y_pred),
+                "mae": mean_absolute_error(y_true, y_pred),
+            }
+        )
+        predictions.append(
+            test[["PERIOD", "DISTRICT", "YEAR", "MONTH"]].assign(
+                Actual=y_true, Predicted=y_pred, split=split
+            )
+        )
+
+    scores = pd.DataFrame(scores)
+    scores["train_until"] = scores["train_until"].map(
+        lambda p: f"{p // 12}-{p % 12 + 1:02d}"
+    )
+    return scores, pd.concat(predictions, ignore_index=True)
+
+
+def forecast(df, target, model_name, horizon=1):
+    """Fits on all history and predicts the next `horizon` months for every district."""
+    features = make_features(df, target, horizon)
+    columns = feature_columns(features, target)
+    last = month_index(df).max()
+
+    future = features[features["PERIOD"] > last].dropna(subset=columns)
+    train = features[features["PERIOD"] <= last].dropna(subset=[target, *columns])
+    model = FORECAST_MODELS[model_name](target)
+    y_pred = _fit_predict(model, train, future, columns, target)
+    return future[["DISTRICT", "YEAR", "MONTH"]].assign(**{target: y_pred}), model
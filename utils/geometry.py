@@ -0,0 +1,75 @@
+import sys
+
+import geopandas as gpd
+from shapely.errors import GEOSException
+
+from utils.data_loader import SHAPEFILE_PATHS, columnar_loader, registry
+
+# Rendered widths (in pixels) each layer is pre-simplified for
+LOD_PIXELS = (500, 1000, 2000, 4000)
+
+
+def lod_name(name, pixels):
+    return f"{name} [{pixels}px]"
+
+
+def simplify_layer(gdf: gpd.GeoDataFrame, pixels: int):
+    """Simplifies geometries so no detail smaller than one pixel at this width is kept."""
+    if gdf.empty:
+        return gdf
+
+    minx, miny, maxx, maxy = gdf.total_bounds
+    tolerance = max(maxx - minx, maxy - miny) / pixels
+    geometry = gdf.geometry
+
+    if geometry.geom_type.isin(["Polygon", "MultiPolygon"]).all():
+        # Coverage simplification keeps shared borders between neighbours identical
+        try:
+            return gdf.set_geometry(geometry.simplify_coverage(tolerance))
+        except (AttributeError, GEOSException):
+            pass
+    return gdf.set_geometry(geometry.simplify(tolerance, preserve_topology=True))
+
+
+def _lod_reader(name, pixels):
+    def read(path):
+        return simplify_layer(registry.get(name), pixels)
+
+    return read
+
+
+for _name, _path in SHAPEFILE_PATHS.items():
+    for _pixels in LOD_PIXELS:
+        registry.register(
+            lod_name(_name, _pixels),
+            _path,
+            columnar_loader(lod_name(_name, _pixels), _lod_reader(_name, _pixels)),
+        )
+
+
+def level_of_detail(name, pixels):
+    """Returns the coarsest cached version of a layer that is detailed enough for the width."""
+    for level in LOD_PIXELS:
+        if level >= pixels:
+            return registry.get(lod_name(name, level))
+    return registry.get(name)
+
+
+def prepare_geometry(names=None):
+    """Builds and caches every level of detail for the given (default: all) layers."""
+    for name in names or SHAPEFILE_PATHS:
+        try:
+            full = registry.get(name)
+        except Exception as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            continue
+        for pixels in LOD_PIXELS:
+            layer = registry.get(lod_name(name, pixels))
+            print(
+                f"{lod_name(name, pixels)}: {layer.geometry.count_coordinates().sum()}"
+                f" of {full.geometry.count_coordinates().sum()} vertices"
+            )
+
+
+if __name__ == "__main__":
+    prepare_geometry(sys.argv[1:])
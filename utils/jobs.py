@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.cache import fingerprint, prune_directory
+from utils import training
+from utils.profiling import timed
+
+JOBS_DIR = os.environ.get("JOBS_DIR", ".cache/jobs")
+# Bound on the dataset copies jobs read, those of queued and running jobs are kept
+JOB_DATA_MAX_BYTES = int(os.environ.get("JOB_DATA_MAX_MB", 1024)) << 20
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+JOB_KINDS = {
+    "train": training.train_single,
+    "search": training.search,
+    "forecast": training.forecast_districts,
+}
+
+ACTIVE_STATES = ("queued", "running")
+
+# Bumped when job results change shape, so finished jobs of older code are not reused
+JOB_FORMAT = 2
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _write_json(path, data):
+    # Written to a temporary file first, so pollers never read a half-written status
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def _write_pickle(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _execute(job_dir, kind, data_path, params):
+    """Runs one job in a worker process, recording progress next to its status."""
+    status_path = os.path.join(job_dir, "status.json")
+    status = _read_json(status_path)
+
+    def report(progress, message, partial=None):
+        if os.path.exists(os.path.join(job_dir, "cancel")):
+            raise JobCancelled()
+        if partial is not None:
+            _write_pickle(os.path.join(job_dir, "partial.pkl"), partial)
+        status.update(progress=progress, message=message)
+        _write_json(status_path, status)
+
+    status.update(state="running", started=time.time(), pid=os.getpid())
+    try:
+        report(0.0, "Loading data")
+        with open(data_path, "rb") as f:
+            df = pickle.load(f)
+        result = JOB_KINDS[kind](df, params, report)
+        _write_pickle(os.path.join(job_dir, "result.pkl"), result)
+        status.update(state="done", progress=1.0, message="Finished")
+    except JobCancelled:
+        status.update(state="cancelled", message="Cancelled")
+    except Exception as e:
+        status.update(state="failed", message=str(e), error=traceback.format_exc())
+    status["finished"] = time.time()
+    _write_json(status_path, status)
+
+
+class JobRunner:
+    """Local queue of training jobs executed by a process pool.
+
+    Jobs are identified by a hash of their kind, dataset fingerprint and
+    parameters, so resubmitting an identical job returns the existing one.
+    Status, progress and results live on disk under the job's directory and
+    outlive the page (and the session) that submitted them. Queued jobs are
+    dispatched round-robin across owners, so one session queueing many jobs
+    does not delay everyone else's.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=JOB_WORKERS):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self._executor = None
+        self._queues = OrderedDict()
+        self._running = {}
+        self._running_data = {}
+        # Reentrant, a job finishing during submit runs its callback on this thread
+        self._lock = threading.RLock()
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    @timed
+    def submit(self, kind, df, params, owner=None):
+        """Queues a job and returns its id, reusing an identical queued or finished job."""
+        data_key = fingerprint(df)
+        spec = json.dumps(
+            [JOB_FORMAT, kind, data_key, params], sort_keys=True, default=str
+        )
+        job_id = hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+        with self._lock:
+            status = self.status(job_id)
+            if status and (
+                status["state"] == "done"
+                or job_id in self._running
+                or self._queued(job_id)
+            ):
+                return job_id
+
+            job_dir = self._job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            for name in ("cancel", "partial.pkl", "result.pkl"):
+                if os.path.exists(os.path.join(job_dir, name)):
+                    os.remove(os.path.join(job_dir, name))
+
+            # Jobs on the same dataset version share one copy of it on disk
+            data_path = os.path.join(self.jobs_dir, "data", f"{data_key}.pkl")
+            if os.path.exists(data_path):
+                # Marks it as recently used for pruning
+                os.utime(data_path)
+            else:
+                os.makedirs(os.path.dirname(data_path), exist_ok=True)
+                _write_pickle(data_path, df)
+
+            _write_json(
+                os.path.join(job_dir, "status.json"),
+                {
+                    "id": job_id,
+                    "kind": kind,
+                    "owner": owner,
+                    "data": data_key,
+                    "params": params,
+                    "state": "queued",
+                    "progress": 0.0,
+                    "message": "Waiting for a worker",
+                    "submitted": time.time(),
+                },
+            )
+            self._queues.setdefault(owner, deque()).append(
+                (job_id, kind, data_path, params)
+            )
+            self._dispatch()
+            self._prune_data()
+        return job_id
+
+    def _prune_data(self):
+        # Called with the lock held, only data no queued or running job reads is removed
+        active = [job[2] for queue in self._queues.values() for job in queue]
+        prune_directory(
+            os.path.join(self.jobs_dir, "data"),
+            JOB_DATA_MAX_BYTES,
+            ".pkl",
+            keep=active + list(self._running_data.values()),
+        )
+
+    def _queued(self, job_id):
+        return any(job[0] == job_id for queue in self._queues.values() for job in queue)
+
+    def _dispatch(self):
+        # Called with the lock held, fills free workers taking one job per owner in turn
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        while self._queues and len(self._running) < self.workers:
+            owner, queue = next(iter(self._queues.items()))
+            job_id, kind, data_path, params = queue.popleft()
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+
+            future = self._executor.submit(
+                _execute, self._job_dir(job_id), kind, data_path, params
+            )
+            self._running[job_id] = future
+            self._running_data[job_id] = data_path
+            future.add_done_callback(
+                lambda future, job_id=job_id: self._finished(job_id, future)
+            )
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._running.pop(job_id, None)
+            self._running_data.pop(job_id, None)
+            if isinstance(future.exception(), BrokenProcessPool):
+                self._executor = None
+            if future.exception() is not None:
+                # The worker died before it could record the failure itself
+                status = self.status(job_id) or {}
+                status.update(state="failed", message=str(future.exception()))
+                _write_json(os.path.join(self._job_dir(job_id), "status.json"), status)
+            self._dispatch()
+
+    def status(self, job_id):
+        """Returns the job's recorded status, or None for an unknown job.
+
+        Jobs left queued or running by an earlier server process are reported
+        as interrupted and can be submitted again.
+        """
+        with self._lock:
+            status = _read_json(os.path.join(self._job_dir(job_id), "status.json"))
+            active = job_id in self._running or self._queued(job_id)
+        if status and status["state"] in ACTIVE_STATES and not active:
+            status.update(state="interrupted", message="Interrupted by a restart")
+        return status
+
+    def partial(self, job_id):
+        """Returns intermediate results published by a running job, if any."""
+        try:
+            with open(os.path.join(self._job_dir(job_id), "partial.pkl"), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def result(self, job_id):
+        with open(os.path.join(self._job_dir(job_id), "result.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def cancel(self, job_id):
+        """Drops a queued job, or asks a running one to stop at its next progress report."""
+        with self._lock:
+            for owner, queue in list(self._queues.items()):
+                if any(job[0] == job_id for job in queue):
+                    self._queues[owner] = deque(j for j in queue if j[0] != job_id)
+                    if not self._queues[owner]:
+                        del self._queues[owner]
+                    status = self.status(job_id)
+                    status.update(state="cancelled", message="Cancelled")
+                    _write_json(
+                        os.path.join(self._job_dir(job_id), "status.json"), status
+                    )
+                    return
+            if job_id in self._running:
+                open(os.path.join(self._job_dir(job_id), "cancel"), "w").close()
+
+    def jobs(self, owner=None):
+        """Returns the status of every job on disk, newest first."""
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        statuses = [
+            self.status(name) for name in os.listdir(self.jobs_dir) if name != "data"
+        ]
+        statuses = [
+            s for s in statuses if s and (owner is None or s.get("owner") == owner)
+        ]
+        return sorted(statuses, key=lambda s: s["submitted"], reverse=True)
+
+
+job_runner = JobRunner()
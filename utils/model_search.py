@@ -0,0 +1,137 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import (
+    ExtraTreesRegressor,
+    HistGradientBoostingRegressor,
+    RandomForestRegressor,
+)
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, r2_score, root_mean_squared_error
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from sklearn.tree import DecisionTreeRegressor
+
+# Candidate estimators and the hyperparameters searched for each
+SEARCH_SPACE = {
+    "Linear Regression": (LinearRegression(), {"fit_intercept": [True, False]}),
+    "Ridge": (Ridge(), {"alpha": [0.01, 0.1, 1.0, 10.0, 100.0]}),
+    "Lasso": (Lasso(max_iter=5000), {"alpha": [0.001, 0.01, 0.1, 1.0]}),
+    "Elastic Net": (
+        ElasticNet(max_iter=5000),
+        {"alpha": [0.001, 0.01, 0.1, 1.0], "l1_ratio": [0.2, 0.5, 0.8]},
+    ),
+    "Decision Tree": (
+        DecisionTreeRegressor(random_state=42),
+        {"max_depth": [4, 8, 16, None], "min_samples_leaf": [1, 5, 20]},
+    ),
+    "Random Forest": (
+        RandomForestRegressor(random_state=42, n_jobs=1),
+        {"n_estimators": [100, 200], "max_depth": [8, 16, None]},
+    ),
+    "Extra Trees": (
+        ExtraTreesRegressor(random_state=42, n_jobs=1),
+        {"n_estimators": [100, 200], "max_depth": [8, 16, None]},
+    ),
+    "Gradient Boosting": (
+        HistGradientBoostingRegressor(random_state=42),
+        {"learning_rate": [0.05, 0.1, 0.2], "max_leaf_nodes": [15, 31, 63]},
+    ),
+}
+
+# Set once per worker process, so the training data is not pickled per task
+_X = None
+_y = None
+
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def _fit_fold(model_name, params, fold, n_splits):
+    model = clone(SEARCH_SPACE[model_name][0]).set_params(**params)
+    splits = KFold(n_splits=n_splits, shuffle=True, random_state=42).split(_X)
+    train_idx, valid_idx = list(splits)[fold]
+    model.fit(_X[train_idx], _y[train_idx])
+    y_pred = model.predict(_X[valid_idx])
+    return {
+        "model": model_name,
+        "params": params,
+        "fold": fold,
+        "r2": r2_score(_y[valid_idx], y_pred),
+        "rmse": root_mean_squared_error(_y[valid_idx], y_pred),
+        "mae": mean_absolute_error(_y[valid_idx], y_pred),
+    }
+
+
+def search_candidates(models, mode="Grid", n_iter=5):
+    """Returns (model name, params) pairs from a full grid or a random sample of it."""
+    candidates = []
+    for name in models:
+        grid = SEARCH_SPACE[name][1]
+        if mode == "Grid":
+            params = ParameterGrid(grid)
+        else:
+            size = len(ParameterGrid(grid))
+            params = ParameterSampler(grid, n_iter=min(n_iter, size), random_state=42)
+        candidates += [(name, p) for p in params]
+    return candidates
+
+
+def run_search(X, y, candidates, n_splits=5, n_jobs=None):
+    """Cross-validates every candidate on a process pool, yielding folds as they finish.
+
+    Closing the generator (e.g. when a Streamlit rerun interrupts the page)
+    cancels the folds that have not started yet.
+    """
+    X = np.asarray(X, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n_jobs = n_jobs or os.cpu_count()
+
+    executor = ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(X, y)
+    )
+    try:
+        pending = {
+            executor.submit(_fit_fold, name, params, fold, n_splits)
+            for name, params in candidates
+            for fold in range(n_splits)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def leaderboard(results):
+    """Averages fold results per candidate, best RMSE first."""
+    if not results:
+        return pd.DataFrame()
+    folds = pd.DataFrame(results)
+    folds["params"] = folds["params"].map(
+        lambda p: ", ".join(f"{k}={v}" for k, v in sorted(p.items()))
+    )
+    board = folds.groupby(["model", "params"]).agg(
+        folds=("fold", "count"),
+        r2=("r2", "mean"),
+        rmse=("rmse", "mean"),
+        rmse_std=("rmse", "std"),
+        mae=("mae", "mean"),
+    )
+    return board.sort_values("rmse").reset_index()
+
+
+def best_model(results):
+    """Returns an unfitted estimator for the candidate with the lowest mean RMSE."""
+    folds = pd.DataFrame(results)
+    folds["key"] = folds["params"].map(lambda p: repr(sorted(p.items())))
+    best = folds.groupby(["model", "key"])["rmse"].mean().idxmin()
+    row = folds[(folds["model"] == best[0]) & (folds["key"] == best[1])].iloc[0]
+    return row["model"], clone(SEARCH_SPACE[row["model"]][0]).set_params(
+        **row["params"]
+    )
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+
+from utils.cache import LRUCache
+
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", ".cache/models")
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+
+class ModelRegistry:
+    """Trained models stored on disk under the hash of their serialized bytes.
+
+    Each version keeps the metadata needed to use it again (feature columns
+    and dtypes, target, training data fingerprint, metrics). Loaded models
+    are shared by every session through a byte-bounded LRU cache, so a
+    prediction never unpickles the model again.
+    """
+
+    def __init__(self, root=MODEL_REGISTRY_DIR, max_bytes=MODEL_CACHE_MAX_BYTES):
+        self.root = root
+        self.cache = LRUCache(max_bytes, name="models")
+
+    def path(self, model_id):
+        return os.path.join(self.root, model_id, "model.pkl")
+
+    def save(
+        self, model, name, features, dtypes, target, data_fingerprint, metrics=None
+    ):
+        """Stores a model version and returns its id, the same for identical models."""
+        data = pickle.dumps(model)
+        model_id = hashlib.sha256(data).hexdigest()[:16]
+        model_dir = os.path.join(self.root, model_id)
+        if os.path.exists(os.path.join(model_dir, "meta.json")):
+            return model_id
+
+        os.makedirs(model_dir, exist_ok=True)
+        meta = {
+            "id": model_id,
+            "name": name,
+            "features": list(features),
+            "dtypes": {col: str(dtype) for col, dtype in dtypes.items()},
+            "target": target,
+            "data_fingerprint": data_fingerprint,
+            "metrics": metrics or {},
+            "created": time.time(),
+            "size": len(data),
+        }
+        # Model bytes first, a version is only listed once its metadata exists
+        for filename, content, mode in [
+            ("model.pkl", data, "wb"),
+            ("meta.json", json.dumps(meta, indent=2), "w"),
+        ]:
+            tmp = os.path.join(model_dir, f"{filename}.{os.getpid()}.tmp")
+            with open(tmp, mode) as f:
+                f.write(content)
+            os.replace(tmp, os.path.join(model_dir, filename))
+        return model_id
+
+    def meta(self, model_id):
+        with open(os.path.join(self.root, model_id, "meta.json")) as f:
+            return json.load(f)
+
+    def versions(self):
+        """Returns the metadata of every stored model, newest first."""
+        if not os.path.isdir(self.root):
+            return []
+        metas = [
+            self.meta(model_id)
+            for model_id in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, model_id, "meta.json"))
+        ]
+        return sorted(metas, key=lambda meta: meta["created"], reverse=True)
+
+    def load(self, model_id):
+        """Returns the model for a version, unpickled at most once while it stays cached."""
+        model = self.cache.get(model_id)
+        if model is None:
+            path = self.path(model_id)
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+            self.cache.put(model_id, model, size=os.path.getsize(path))
+        return model
+
+
+model_registry = ModelRegistry()
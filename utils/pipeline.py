@@ -0,0 +1,175 @@
+import pandas as pd
+
+from utils.artifacts import artifact_key, artifact_store
+from utils.cache import fingerprint
+from utils.data_preprocessing import (
+    convert_dtypes,
+    get_column_info,
+    handle_missing_values,
+    melt_dataframe,
+    pivot_dataframe,
+)
+from utils.dtypes import convert_columns, infer_dtypes
+from utils.spatial import admin_sources, attach_admin_ids
+from utils.profiling import timed
+
+# Copy-on-write lets every step share unchanged columns with its input.
+# It is always on from pandas 3, older versions need it enabled explicitly.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+OPERATIONS = {
+    "melt": melt_dataframe,
+    "pivot": pivot_dataframe,
+    "missing": handle_missing_values,
+    "astype": convert_dtypes,
+    "admin": attach_admin_ids,
+}
+
+# What an operation reads besides its input frame, added to its outputs' keys so
+# stored outputs are not reused once those sources change
+OPERATION_SOURCES = {
+    "admin": admin_sources,
+}
+
+
+def _key_params(op, params):
+    sources = OPERATION_SOURCES.get(op)
+    return params if sources is None else {**params, "sources": sources()}
+
+
+class Pipeline:
+    """Replayable preprocessing steps over a shared base frame that is never mutated.
+
+    Each step's output is stored in the artifact store under a key derived
+    from the base frame's fingerprint and every step up to it, so sessions
+    applying the same steps to the same data compute each output once.
+    """
+
+    def __init__(self, base: pd.DataFrame):
+        self.base = base
+        self.steps = []
+        # Steps before the cursor are active, the ones after it can be redone
+        self.cursor = 0
+        self._frame = (0, base)
+        self._column_info = None
+        self._suggested_types = None
+        # Artifact keys of the frame after 0, 1, ... steps, derived on demand
+        self._keys = []
+
+    def _key(self, position):
+        if not self._keys:
+            self._keys.append(fingerprint(self.base))
+        while len(self._keys) <= position:
+            op, params = self.steps[len(self._keys) - 1]
+            self._keys.append(artifact_key(self._keys[-1], op, _key_params(op, params)))
+        return self._keys[position]
+
+    def apply(self, op: str, **params):
+        """Adds a step after the cursor, dropping any undone steps."""
+        key = artifact_key(self._key(self.cursor), op, _key_params(op, params))
+        frame = artifact_store.get_or_compute(
+            key, lambda: OPERATIONS[op](self.materialize(), **params)
+        )
+        return self._push(op, params, key, frame)
+
+    def convert(self, new_types: dict):
+        """Adds a step converting the columns that can be, returns {column: error} for the rest.
+
+        Columns that fail the full conversion are left out of the step, so
+        replaying it converts the same columns without failing.
+        """
+        frame, failures = convert_columns(self.materialize(), new_types)
+        converted = {col: t for col, t in new_types.items() if col not in failures}
+        if converted:
+            params = {"new_types": converted}
+            key = artifact_key(self._key(self.cursor), "astype", params)
+            if key not in artifact_store:
+                artifact_store.put(key, frame)
+            self._push("astype", params, key, frame)
+        return failures
+
+    def _push(self, op, params, key, frame):
+        del self.steps[self.cursor :]
+        del self._keys[self.cursor + 1 :]
+        self.steps.append((op, params))
+        self._keys.append(key)
+        self.cursor += 1
+        self._frame = (self.cursor, frame)
+        return frame
+
+    @timed
+    def materialize(self):
+        """Returns the frame after the active steps, replaying them only if needed."""
+        cursor, frame = self._frame
+        if cursor != self.cursor:
+            if cursor > self.cursor:
+                cursor, frame = 0, self.base
+            # Resumes from the latest stored state instead of replaying every step
+            for position in range(self.cursor, cursor, -1):
+                stored = artifact_store.get(self._key(position))
+                if stored is not None:
+                    cursor, frame = position, stored
+                    break
+            for position in range(cursor, self.cursor):
+                op, params = self.steps[position]
+                frame = artifact_store.get_or_compute(
+                    self._key(position + 1),
+                    lambda frame=frame: OPERATIONS[op](frame, **params),
+                )
+            # Only the latest result is kept, earlier states come from the store
+            self._frame = (self.cursor, frame)
+        return frame
+
+    def column_info(self):
+        """Returns get_column_info for the current frame, computed once per state."""
+        frame = self.materialize()
+        # Keyed by the frame, undo then apply returns to a cursor with another frame
+        if self._column_info is None or self._column_info[0] is not frame:
+            self._column_info = (frame, get_column_info(frame))
+        return self._column_info[1]
+
+    def suggested_types(self):
+        """Returns infer_dtypes for the current frame, computed once per state."""
+        frame = self.materialize()
+        if self._suggested_types is None or self._suggested_types[0] is not frame:
+            self._suggested_types = (frame, infer_dtypes(frame))
+        return self._suggested_types[1]
+
+    @property
+    def can_undo(self):
+        return self.cursor > 0
+
+    @property
+    def can_redo(self):
+        return self.cursor < len(self.steps)
+
+    def undo(self):
+        if self.can_undo:
+            self.cursor -= 1
+
+    def redo(self):
+        if self.can_redo:
+            self.cursor += 1
+
+    def describe_steps(self):
+        """Returns a readable label for each active step."""
+        labels = []
+        for op, params in self.steps[: self.cursor]:
+            if op == "melt":
+                labels.append(
+                    f"Reformat to long format (ID columns: {params['id_vars']})"
+                )
+            elif op == "pivot":
+                labels.append(
+                    f"Reformat to wide format (one column per {params['columns']})"
+                )
+            elif op == "admin":
+                labels.append("Attach province and district from boundaries")
+            elif op == "missing":
+                labels.append(f"Missing values: {params['strategy']}")
+            else:
+                labels.append(
+                    f"Convert data types of {len(params['new_types'])} columns"
+                )
+        return labels
@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import time
+import cProfile
+import functools
+import threading
+import weakref
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from utils.cache import cache_counters
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", ".cache/profiles")
+# Every finished rerun is appended here as one JSON line
+PROFILE_LOG = os.path.join(PROFILE_DIR, "reruns.jsonl")
+PROFILE_LOG_MAX_BYTES = int(os.environ.get("PROFILE_LOG_MAX_MB", 16)) << 20
+# cProfile captures kept on disk, the slowest reruns win
+PROFILE_CAPTURES_KEPT = int(os.environ.get("PROFILE_CAPTURES_KEPT", 5))
+
+# Reruns not finished after this long no longer keep memory tracing on
+PROFILE_RERUN_TIMEOUT_S = float(os.environ.get("PROFILE_RERUN_TIMEOUT_S", 600))
+
+_current = threading.local()
+_log_lock = threading.Lock()
+_tracing_lock = threading.Lock()
+# Reruns tracing memory, dropped when their session is gone
+_tracing_reruns = weakref.WeakSet()
+
+
+class Span:
+    """Wall time, CPU time, cache hits/misses and optionally allocations of a block."""
+
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.trace_memory = trace_memory and tracemalloc.is_tracing()
+        self.caches = cache_counters()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.thread = threading.get_ident()
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+
+    def close(self, end=None):
+        wall = (end or time.perf_counter()) - self.wall
+        # CPU time is per thread, unknown when closed from another script run
+        cpu = time.thread_time() - self.cpu
+        record = {
+            "name": self.name,
+            "wall_ms": wall * 1000,
+            "cpu_ms": cpu * 1000 if threading.get_ident() == self.thread else None,
+        }
+        caches = {}
+        for name, (hits, misses) in cache_counters().items():
+            before = self.caches.get(name, (0, 0))
+            if (hits, misses) != before:
+                caches[name] = (hits - before[0], misses - before[1])
+        record["cache_hits"] = sum(hits for hits, _ in caches.values())
+        record["cache_misses"] = sum(misses for _, misses in caches.values())
+        record["caches"] = caches
+        if self.trace_memory:
+            # Tracing is process-wide, concurrent sessions add to the peak
+            peak = tracemalloc.get_traced_memory()[1] - self.memory
+            record["peak_alloc_mb"] = max(peak, 0) / 2**20
+        return record
+
+
+class Rerun:
+    """Timings of one script run of a page, split into stages marked by the page.
+
+    Functions decorated with `timed` are recorded as calls of the stage they
+    ran in. A page that stops early (st.stop, an exception) is closed when
+    the session's next rerun starts, at the end of its last recorded event.
+    """
+
+    def __init__(self, page, trace_memory=False, capture=False):
+        self.page = page
+        self.started_at = time.time()
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.calls = []
+        self.finished = False
+        self._started = time.perf_counter()
+        self._last_event = self._started
+        if trace_memory:
+            _set_tracing(self, True)
+        self._stage = Span("Setup", trace_memory)
+        self._profile = None
+        if capture:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stage(self, name):
+        if self.finished:
+            return
+        self._close_stage()
+        self._stage = Span(name, self.trace_memory)
+
+    def _close_stage(self, end=None):
+        self.stages.append(self._stage.close(end))
+        self._last_event = end or time.perf_counter()
+
+    def record_call(self, span):
+        self.calls.append({**span.close(), "stage": self._stage.name})
+        self._last_event = time.perf_counter()
+
+    def finish(self, stopped=False):
+        """Closes the rerun and returns its JSON-serializable record."""
+        if stopped:
+            self._close_stage(self._last_event)
+        else:
+            self._close_stage()
+        self.finished = True
+        if self.trace_memory:
+            _set_tracing(self, False)
+        if self._profile is not None:
+            self._profile.disable()
+        return {
+            "page": self.page,
+            "started_at": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)
+            ),
+            "wall_ms": (self._last_event - self._started) * 1000,
+            "cpu_ms": sum(stage["cpu_ms"] or 0 for stage in self.stages),
+            "stopped_early": stopped,
+            "stages": self.stages,
+            "calls": self.calls,
+        }
+
+
+def _set_tracing(rerun, enabled):
+    # tracemalloc is process-wide, it runs while any live, recent rerun asks for it.
+    # Reruns of sessions that left are garbage collected or time out, so a
+    # rerun that is never finished cannot keep it on.
+    with _tracing_lock:
+        if enabled:
+            _tracing_reruns.add(rerun)
+        else:
+            _tracing_reruns.discard(rerun)
+        now = time.perf_counter()
+        for other in list(_tracing_reruns):
+            if other.finished or now - other._last_event > PROFILE_RERUN_TIMEOUT_S:
+                _tracing_reruns.discard(other)
+        if _tracing_reruns and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not _tracing_reruns and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def export(record):
+    """Appends a rerun record to the metrics log, rotating it past its size limit."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with _log_lock:
+        if (
+            os.path.exists(PROFILE_LOG)
+            and os.path.getsize(PROFILE_LOG) > PROFILE_LOG_MAX_BYTES
+        ):
+            os.replace(PROFILE_LOG, f"{PROFILE_LOG}.1")
+        with open(PROFILE_LOG, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def keep_capture(profile, record):
+    """Saves a cProfile capture if the rerun is among the slowest kept so far.
+
+    Captures are pstats files, readable with `python -m pstats` or snakeviz.
+    """
+    directory = os.path.join(PROFILE_DIR, "captures")
+    os.makedirs(directory, exist_ok=True)
+    page = re.sub(r"\W+", "_", record["page"]).strip("_")
+    stamp = record["started_at"].replace(":", "")
+    # Zero-padded durations sort the captures from fastest to slowest by name
+    name = f"{int(record['wall_ms']):09d}ms_{page}_{stamp}.prof"
+
+    with _log_lock:
+        captures = sorted(f for f in os.listdir(directory) if f.endswith(".prof"))
+        if len(captures) >= PROFILE_CAPTURES_KEPT and name < captures[0]:
+            return None
+        path = os.path.join(directory, name)
+        profile.dump_stats(path)
+        captures = sorted(captures + [name])
+        for old in captures[: max(len(captures) - PROFILE_CAPTURES_KEPT, 0)]:
+            os.remove(os.path.join(directory, old))
+    return path
+
+
+def _close(rerun, stopped):
+    record = rerun.finish(stopped)
+    export(record)
+    if rerun._profile is not None:
+        record["capture"] = keep_capture(rerun._profile, record)
+    st.session_state["profile_last"] = record
+    return record
+
+
+def start_rerun(page):
+    """Starts recording this script run, closing the session's previous one."""
+    previous = st.session_state.get("profile_rerun")
+    if previous is not None and not previous.finished:
+        _close(previous, stopped=True)
+
+    trace_memory = st.session_state.get("profile_memory", False)
+    rerun = Rerun(page, trace_memory, st.session_state.get("profile_capture", False))
+    st.session_state["profile_rerun"] = rerun
+    _current.rerun = rerun
+    return rerun
+
+
+def stage(name):
+    """Marks the start of a page section, the previous one ends here."""
+    rerun = getattr(_current, "rerun", None)
+    if rerun is not None:
+        rerun.stage(name)
+
+
+def finish_rerun():
+    rerun = getattr(_current, "rerun", None)
+    if rerun is not None and not rerun.finished:
+        _close(rerun, stopped=False)
+
+
+def stop():
+    """Finishes this rerun's record and stops the page, like st.stop."""
+    finish_rerun()
+    st.stop()
+
+
+@contextmanager
+def section(name):
+    """Records a block as a call of the current stage, outside of a rerun it does nothing."""
+    rerun = getattr(_current, "rerun", None)
+    if rerun is None or rerun.finished:
+        yield
+        return
+    span = Span(name)
+    try:
+        yield
+    finally:
+        rerun.record_call(span)
+
+
+def timed(fn):
+    """Records every call of a function made during a rerun."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with section(fn.__qualname__):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def sidebar_panel():
+    """Shows where the session's previous rerun spent its time."""
+    with st.sidebar.expander("⏱️ Profiling"):
+        st.toggle("Trace memory allocations", key="profile_memory")
+        st.toggle("Capture cProfile of slow reruns", key="profile_capture")
+
+        last = st.session_state.get("profile_last")
+        if last is None:
+            st.caption("Timings appear here after the first rerun.")
+            return
+        st.caption(
+            f"Last rerun of {last['page']}: {last['wall_ms']:.0f} ms wall, "
+            f"{last['cpu_ms']:.0f} ms CPU"
+            + (" (stopped early)" if last["stopped_early"] else "")
+        )
+        columns = ["wall_ms", "cpu_ms", "cache_hits", "cache_misses"]
+        if any("peak_alloc_mb" in stage for stage in last["stages"]):
+            columns.append("peak_alloc_mb")
+        stages = pd.DataFrame(last["stages"]).set_index("name")[columns]
+        st.dataframe(stages.round(1), use_container_width=True)
+
+        if last["calls"]:
+            calls = (
+                pd.DataFrame(last["calls"])
+                .groupby("name")
+                .agg(
+                    calls=("wall_ms", "size"),
+                    wall_ms=("wall_ms", "sum"),
+                    cache_misses=("cache_misses", "sum"),
+                )
+                .sort_values("wall_ms", ascending=False)
+            )
+            st.dataframe(calls.round(1), use_container_width=True)
+        if last.get("capture"):
+            st.caption(f"cProfile capture saved to `{last['capture']}`")
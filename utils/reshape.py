@@ -0,0 +1,158 @@
+import os
+import re
+import calendar
+
+import numpy as np
+import pandas as pd
+
+# Above this many melted cells, value columns are melted a block at a time
+RESHAPE_CHUNK_CELLS = int(os.environ.get("RESHAPE_CHUNK_CELLS", 5_000_000))
+VARIABLE_TYPES = ["Auto-detect", "Category", "Integer year", "Month", "Date"]
+
+_YEAR = re.compile(r"^\s*(?:YR)?(\d{4})(?:\.0)?\s*$", re.IGNORECASE)
+# A date label must name its year, pd.to_datetime reads "May" as 0001-05-01
+_HAS_YEAR = re.compile(r"(?<!\d)\d{4}(?!\d)")
+_MONTHS = {
+    **{name.lower(): i for i, name in enumerate(calendar.month_abbr) if name},
+    **{name.lower(): i for i, name in enumerate(calendar.month_name) if name},
+    "sept": 9,
+}
+
+
+def parse_dates(labels):
+    """Returns the labels as datetimes, NaT where a label is no date with a year."""
+    labels = pd.Index([str(label) for label in labels])
+    dates = pd.to_datetime(labels, errors="coerce", format="mixed")
+    return dates.where(labels.str.contains(_HAS_YEAR))
+
+
+def parse_headers(headers, var_type="Auto-detect"):
+    """Returns the values of the variable column for a list of column headers.
+
+    Year-like headers (2006, "2006", "YR2006") become int16 years, month
+    names ("Jan", "February") int8 month numbers and dated ones ("2006-01",
+    "Jan 2006") datetimes when every header parses. Anything else stays a
+    categorical of the header labels.
+    """
+    labels = [str(header) for header in headers]
+    if var_type in ("Auto-detect", "Integer year"):
+        years = [_YEAR.match(label) for label in labels]
+        if all(years):
+            return pd.Index([int(year.group(1)) for year in years], dtype="int16")
+        if var_type == "Integer year":
+            bad = [label for label, year in zip(labels, years) if not year][:5]
+            raise ValueError(f"Column headers are not years: {bad}")
+    if var_type in ("Auto-detect", "Month"):
+        months = [_MONTHS.get(label.strip().rstrip(".").lower()) for label in labels]
+        if all(months):
+            return pd.Index(months, dtype="int8")
+        if var_type == "Month":
+            bad = [label for label, month in zip(labels, months) if not month][:5]
+            raise ValueError(f"Column headers are not month names: {bad}")
+    if var_type in ("Auto-detect", "Date"):
+        dates = parse_dates(labels)
+        if not dates.isna().any():
+            return dates
+        if var_type == "Date":
+            bad = [label for label, date in zip(labels, dates) if pd.isna(date)][:5]
+            raise ValueError(f"Column headers are not dates: {bad}")
+    return pd.CategoricalIndex(labels, categories=list(dict.fromkeys(labels)))
+
+
+def _id_columns(df: pd.DataFrame, id_vars):
+    # Text ID columns become categoricals, so each repetition costs one code
+    columns = {}
+    for col in id_vars:
+        values = df[col]
+        if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            values = values.astype("category")
+        columns[col] = values
+    return columns
+
+
+def iter_melt(
+    df: pd.DataFrame,
+    id_vars,
+    var_name,
+    value_name,
+    var_type="Auto-detect",
+    chunk_columns=None,
+):
+    """Yields the long format of a wide frame, `chunk_columns` value columns at a time.
+
+    Rows come in the same order as pd.melt. Each block only holds its own
+    rows, so a very wide sheet can be melted and written out block by block.
+    """
+    value_vars = [col for col in df.columns if col not in id_vars]
+    variables = parse_headers(value_vars, var_type)
+    ids = _id_columns(df, id_vars)
+    n = len(df)
+    step = chunk_columns or max(len(value_vars), 1)
+
+    for start in range(0, len(value_vars), step):
+        block = value_vars[start : start + step]
+        rows = np.tile(np.arange(n), len(block))
+        columns = {
+            col: values.take(rows).reset_index(drop=True) for col, values in ids.items()
+        }
+        columns[var_name] = variables[start : start + len(block)].repeat(n)
+        values = df[block]
+        dtypes = set(values.dtypes)
+        dtype = dtypes.pop() if len(dtypes) == 1 else None
+        # Extension dtypes (Int64, Float64) would come out of to_numpy as object
+        if isinstance(dtype, np.dtype) and pd.api.types.is_numeric_dtype(dtype):
+            # One column-major copy of the block, no per-column Series
+            columns[value_name] = values.to_numpy().reshape(-1, order="F")
+        else:
+            columns[value_name] = pd.concat(
+                [values[col] for col in block], ignore_index=True
+            )
+        yield pd.DataFrame(columns)
+
+
+def melt_wide(df: pd.DataFrame, id_vars, var_name, value_name, var_type="Auto-detect"):
+    """Melts a wide frame to long format and returns (long frame, column info).
+
+    Large inputs are melted in blocks bounded by RESHAPE_CHUNK_CELLS. The
+    column info has the layout of get_column_info and is derived from the
+    wide frame, without scanning the long one.
+    """
+    value_vars = [col for col in df.columns if col not in id_vars]
+    if not value_vars:
+        raise ValueError("No columns to unpivot, select fewer ID columns")
+    if var_name in id_vars or value_name in id_vars or var_name == value_name:
+        raise ValueError("Variable and value column names must be new and distinct")
+
+    chunk_columns = max(1, RESHAPE_CHUNK_CELLS // max(len(df), 1))
+    blocks = list(iter_melt(df, id_vars, var_name, value_name, var_type, chunk_columns))
+    long = blocks[0] if len(blocks) == 1 else pd.concat(blocks, ignore_index=True)
+
+    repeats = len(value_vars)
+    missing = {col: int(df[col].isna().sum()) * repeats for col in id_vars}
+    missing[var_name] = 0
+    missing[value_name] = int(df[value_vars].isna().sum().sum())
+    info = (
+        pd.DataFrame({"Column": long.columns, "Type": long.dtypes.astype(str).values}),
+        pd.DataFrame({"Column": list(missing), "Missing": list(missing.values())}),
+    )
+    return long, info
+
+
+def pivot_long(df: pd.DataFrame, index, columns, values):
+    """Pivots a long frame back to wide format, one column per value of `columns`.
+
+    Duplicate index/column pairs keep their first value.
+    """
+    if columns in index or values in index or columns == values:
+        raise ValueError("Index, header and value columns must be distinct")
+    # Only observed combinations, pivot_table would expand categoricals to all of them
+    wide = (
+        df.groupby(index + [columns], observed=True, sort=False, dropna=False)[values]
+        .first()
+        .unstack(columns)
+    )
+    wide.columns = [
+        header.strftime("%Y-%m-%d") if isinstance(header, pd.Timestamp) else header
+        for header in wide.columns
+    ]
+    return wide.reset_index()
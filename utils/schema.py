@@ -0,0 +1,75 @@
+import pandas as pd
+
+MONTHLY_CLIMATE_MEASURES = [
+    "PRECTOT",
+    "PS",
+    "QV2M",
+    "RH2M",
+    "T2M",
+    "T2MWET",
+    "T2M_MAX",
+    "T2M_MIN",
+    "T2M_RANGE",
+    "TS",
+    "WS10M",
+    "WS10M_MAX",
+    "WS10M_MIN",
+    "WS10M_RANGE",
+    "WS50M",
+    "WS50M_MAX",
+    "WS50M_MIN",
+    "WS50M_RANGE",
+]
+
+# Declared dtypes for nepal_district_monthly_climate_data.csv, applied while parsing
+MONTHLY_CLIMATE_SCHEMA = {
+    "dtype": {
+        "YEAR": "int16",
+        "MONTH": "int8",
+        "DISTRICT": "category",
+        "LAT": "float32",
+        "LON": "float32",
+        **{measure: "float32" for measure in MONTHLY_CLIMATE_MEASURES},
+    },
+    "parse_dates": ["DATE"],
+    # Most rows are ISO dates but some districts use m/d/Y
+    "date_format": "mixed",
+}
+
+SCHEMAS = {
+    "District Wise Monthly Climate": MONTHLY_CLIMATE_SCHEMA,
+}
+
+
+def read_csv_with_schema(path, schema, **kwargs):
+    """Reads a CSV with its declared dtypes so no column is parsed twice."""
+    return pd.read_csv(path, **schema, **kwargs)
+
+
+def read_monthly_climate(path, **kwargs):
+    """Reads the district monthly climate CSV with its compact schema."""
+    return read_csv_with_schema(path, MONTHLY_CLIMATE_SCHEMA, **kwargs)
+
+
+def _default_bytes(series: pd.Series):
+    # What a schema-less read_csv would hold: object strings or 8-byte numbers
+    if pd.api.types.is_numeric_dtype(series) and not isinstance(
+        series.dtype, pd.CategoricalDtype
+    ):
+        return len(series) * 8
+    return int(series.astype(str).astype(object).memory_usage(deep=True, index=False))
+
+
+def memory_report(df: pd.DataFrame):
+    """Returns bytes used per column against a schema-less parse of the same data."""
+    report = pd.DataFrame(
+        {
+            "Column": df.columns,
+            "Type": df.dtypes.astype(str).values,
+            "Default Bytes": [_default_bytes(df[col]) for col in df.columns],
+            "Bytes": df.memory_usage(deep=True, index=False).values,
+        }
+    )
+    report["Saved Bytes"] = report["Default Bytes"] - report["Bytes"]
+    report["Saved %"] = (100 * report["Saved Bytes"] / report["Default Bytes"]).round(1)
+    return report
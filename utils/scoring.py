@@ -0,0 +1,120 @@
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.cache import prune_directory
+
+PREDICT_CHUNK_ROWS = 100_000
+PREDICTIONS_DIR = os.environ.get("PREDICTIONS_DIR", ".cache/predictions")
+# Bound on the prediction files kept on disk, least recently used are removed first
+PREDICTIONS_MAX_BYTES = int(os.environ.get("PREDICTIONS_MAX_MB", 1024)) << 20
+
+# Columns carried into the output next to the prediction when the input has them
+ID_COLUMNS = ["DISTRICT", "DATE", "YEAR", "MONTH", "LAT", "LON"]
+
+
+def read_chunks(file, name, chunksize=PREDICT_CHUNK_ROWS):
+    """Yields an uploaded CSV or Parquet file as frames of at most `chunksize` rows."""
+    # Uploads are reused across reruns, start from the beginning every time
+    file.seek(0)
+    if name.lower().endswith(".parquet"):
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file, chunksize=chunksize)
+
+
+def check_columns(columns, features):
+    """Raises a ValueError naming the model features missing from the input."""
+    missing = [col for col in features if col not in columns]
+    if missing:
+        raise ValueError(f"Input is missing the model's feature columns: {missing}")
+
+
+def align_features(chunk: pd.DataFrame, features, dtypes):
+    """Selects the model's features in training order, cast to their training dtypes."""
+    check_columns(chunk.columns, features)
+    aligned = chunk[features]
+    try:
+        return aligned.astype(dtypes)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Input columns do not match the model's dtypes: {e}") from e
+
+
+def iter_predictions(model, chunks, meta):
+    """Predicts chunk by chunk, yielding identifier columns and the prediction."""
+    features, dtypes = meta["features"], meta["dtypes"]
+    for chunk in chunks:
+        X = align_features(chunk, features, dtypes)
+        ids = [col for col in ID_COLUMNS if col in chunk.columns]
+        yield chunk[ids].assign(**{f"{meta['target']}_PREDICTED": model.predict(X)})
+
+
+def score_to_file(model, chunks, meta, key):
+    """Writes predictions to a CSV one chunk at a time and returns (path, rows).
+
+    Only one chunk and its predictions are in memory at any point.
+    """
+    os.makedirs(PREDICTIONS_DIR, exist_ok=True)
+    name = hashlib.sha256(repr((meta["id"], key)).encode()).hexdigest()[:16]
+    path = os.path.join(PREDICTIONS_DIR, f"{name}.csv")
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    rows = 0
+    try:
+        with open(tmp, "w", newline="") as f:
+            for result in iter_predictions(model, chunks, meta):
+                result.to_csv(f, header=rows == 0, index=False)
+                rows += len(result)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    prune_directory(PREDICTIONS_DIR, PREDICTIONS_MAX_BYTES, ".csv", keep=[path])
+    return path, rows
+
+
+def climate_rows(df: pd.DataFrame, districts, years, features=()):
+    """Returns observed rows for the districts and years, plus future months past the data.
+
+    Future months only carry calendar and location columns (ID_COLUMNS), so
+    a ValueError names any other feature the model would need for them
+    rather than scoring made-up values.
+    """
+    selected = df[df["DISTRICT"].isin(districts)]
+    observed = selected[selected["YEAR"].between(*years)]
+
+    last = pd.Timestamp(selected["DATE"].max()) if len(selected) else None
+    end = pd.Timestamp(year=years[1], month=12, day=31)
+    if last is None or end <= last:
+        return observed
+
+    unavailable = [col for col in features if col not in ID_COLUMNS]
+    if unavailable:
+        raise ValueError(
+            f"Months after {last:%Y-%m} have no values for {unavailable}, "
+            "only calendar and location features can be scored there"
+        )
+
+    start = max(
+        last + pd.offsets.MonthEnd(1), pd.Timestamp(year=years[0], month=1, day=31)
+    )
+    dates = pd.date_range(start, end, freq="ME")
+    locations = (
+        selected.groupby("DISTRICT", observed=True)[["LAT", "LON"]].first()
+        if {"LAT", "LON"} <= set(selected.columns)
+        else pd.DataFrame(index=pd.Index(districts, name="DISTRICT"))
+    )
+    future = locations.reset_index().merge(pd.DataFrame({"DATE": dates}), how="cross")
+    future["YEAR"] = future["DATE"].dt.year.astype(df["YEAR"].dtype)
+    future["MONTH"] = future["DATE"].dt.month.astype(df["MONTH"].dtype)
+    future["DISTRICT"] = future["DISTRICT"].astype(df["DISTRICT"].dtype)
+    return pd.concat([observed, future], ignore_index=True)
+
+
+def frame_chunks(df: pd.DataFrame, chunksize=PREDICT_CHUNK_ROWS):
+    for start in np.arange(0, len(df), chunksize):
+        yield df.iloc[start : start + chunksize]
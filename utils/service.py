@@ -0,0 +1,243 @@
+import os
+import time
+import asyncio
+import argparse
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pandas as pd
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from utils.models import model_registry
+from utils.scoring import align_features
+
+# Single-row requests arriving within this window are predicted together
+BATCH_MAX_ROWS = int(os.environ.get("SERVICE_BATCH_MAX_ROWS", 256))
+BATCH_MAX_WAIT_MS = float(os.environ.get("SERVICE_BATCH_MAX_WAIT_MS", 5))
+# Latencies kept for the percentiles reported by /metrics
+METRICS_WINDOW = 10_000
+
+
+class ServiceMetrics:
+    """Request counters and a sliding window of request latencies."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.latencies = deque(maxlen=window)
+
+    def observe(self, started, rows=1, error=False):
+        self.requests += 1
+        self.errors += error
+        self.rows += 0 if error else rows
+        self.latencies.append((time.time(), time.perf_counter() - started))
+
+    def report(self):
+        now = time.time()
+        latencies = np.array([latency for _, latency in self.latencies]) * 1000
+        last_minute = sum(1 for stamp, _ in self.latencies if stamp > now - 60)
+        percentiles = (
+            np.percentile(latencies, [50, 95, 99]) if len(latencies) else [None] * 3
+        )
+        return {
+            "uptime_s": now - self.started,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rows_predicted": self.rows,
+            "requests_per_s_last_minute": last_minute / 60,
+            "latency_ms": dict(zip(["p50", "p95", "p99"], percentiles)),
+            "batches": self.batches,
+            "mean_batch_rows": (
+                self.batched_rows / self.batches if self.batches else None
+            ),
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent single-row requests for a model into one predict call."""
+
+    def __init__(self, model, meta, metrics):
+        self.model = model
+        self.meta = meta
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def predict(self, row):
+        # Checked up front, a bad row would otherwise fail the whole batch it joins
+        align_features(pd.DataFrame([row]), self.meta["features"], self.meta["dtypes"])
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + BATCH_MAX_WAIT_MS / 1000
+        while len(batch) < BATCH_MAX_ROWS:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _predict(self, rows):
+        X = align_features(
+            pd.DataFrame(rows), self.meta["features"], self.meta["dtypes"]
+        )
+        # Off the event loop, so requests keep queueing while the model runs
+        return await asyncio.to_thread(self.model.predict, X)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._process(batch)
+            except Exception as e:
+                # One failed batch must not end the loop, later requests would hang
+                for _, future in batch:
+                    _settle(future, exception=e)
+
+    async def _process(self, batch):
+        # Requests whose client went away have a cancelled future, skip them
+        batch = [(row, future) for row, future in batch if not future.done()]
+        if not batch:
+            return
+        rows, futures = zip(*batch)
+        try:
+            predictions = await self._predict(rows)
+        except Exception as e:
+            if len(batch) == 1:
+                _settle(futures[0], exception=e)
+                return
+            # Retried row by row, so only the rows that cannot be predicted fail
+            for row, future in batch:
+                try:
+                    prediction = (await self._predict([row]))[0]
+                except Exception as row_error:
+                    _settle(future, exception=row_error)
+                else:
+                    _settle(future, result=float(prediction))
+            return
+
+        self.metrics.batches += 1
+        self.metrics.batched_rows += len(batch)
+        for future, prediction in zip(futures, predictions):
+            _settle(future, result=float(prediction))
+
+
+def _settle(future, result=None, exception=None):
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class PredictionService:
+    """Registry models kept loaded for the lifetime of the process."""
+
+    def __init__(self, registry=model_registry):
+        self.registry = registry
+        self.batchers = {}
+        self.metrics = ServiceMetrics()
+
+    def warm(self, model_ids=None):
+        """Loads the given model versions (all of them by default) and starts their batchers."""
+        for meta in self.registry.versions():
+            if model_ids is None or meta["id"] in model_ids:
+                self.batcher(meta["id"])
+
+    def batcher(self, model_id):
+        if model_id not in self.batchers:
+            meta = self.registry.meta(model_id)
+            model = self.registry.load(model_id)
+            self.batchers[model_id] = MicroBatcher(model, meta, self.metrics)
+        return self.batchers[model_id]
+
+
+service = PredictionService()
+
+
+async def health(request):
+    return JSONResponse({"status": "ok", "models_loaded": len(service.batchers)})
+
+
+async def list_models(request):
+    return JSONResponse(service.registry.versions())
+
+
+async def metrics(request):
+    return JSONResponse(service.metrics.report())
+
+
+async def predict(request):
+    """Predicts {"features": {...}} as one micro-batched row, or {"rows": [...]} directly."""
+    started = time.perf_counter()
+    model_id = request.path_params["model_id"]
+    try:
+        batcher = service.batcher(model_id)
+    except FileNotFoundError:
+        service.metrics.observe(started, error=True)
+        return JSONResponse({"error": f"Unknown model {model_id}"}, status_code=404)
+
+    try:
+        body = await request.json()
+        if "rows" in body:
+            X = align_features(
+                pd.DataFrame(body["rows"]),
+                batcher.meta["features"],
+                batcher.meta["dtypes"],
+            )
+            predictions = await asyncio.to_thread(batcher.model.predict, X)
+            result, rows = {"predictions": predictions.tolist()}, len(X)
+        else:
+            result, rows = {"prediction": await batcher.predict(body["features"])}, 1
+    except (ValueError, KeyError, TypeError) as e:
+        service.metrics.observe(started, error=True)
+        return JSONResponse({"error": str(e)}, status_code=422)
+
+    service.metrics.observe(started, rows=rows)
+    return JSONResponse(
+        {"model_id": model_id, "target": batcher.meta["target"], **result}
+    )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    model_ids = os.environ.get("SERVICE_MODELS")
+    service.warm(model_ids.split(",") if model_ids else None)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health),
+        Route("/models", list_models),
+        Route("/metrics", metrics),
+        Route("/models/{model_id}/predict", predict, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve registered models over HTTP with micro-batched predictions."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port)
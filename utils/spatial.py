@@ -0,0 +1,163 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from utils.cache import LRUCache, estimate_size, fingerprint
+from utils.data_loader import SHAPEFILE_PATHS, load_dataset, source_mtime
+from utils.geometry import LOD_PIXELS, level_of_detail
+
+# Boundary layers used to look up each admin level, first existing source wins
+ADMIN_LAYERS = {
+    "PROVINCE": ["Provincial Boundary"],
+    "DISTRICT": ["District Boundary (SHP)", "District Boundary (GeoJSON)"],
+}
+
+# Polygon attributes copied onto the points for each admin level
+ADMIN_ATTRIBUTES = {
+    "PROVINCE": {"State": "PROVINCE", "State_Code": "PROVINCE_CODE"},
+    "DISTRICT": {"OBJECTID": "DISTRICT_ID", "District": "BOUNDARY_DISTRICT"},
+}
+
+# Points this far outside every polygon (as a fraction of the layer extent) still match
+NEAREST_SNAP_FRACTION = 0.005
+
+# Indexes are shared by every session, one is built at a time
+index_cache = LRUCache(
+    int(os.environ.get("SPATIAL_INDEX_CACHE_MAX_MB", 128)) << 20, name="spatial indexes"
+)
+_index_lock = threading.Lock()
+join_cache = LRUCache(
+    int(os.environ.get("SPATIAL_CACHE_MAX_MB", 64)) << 20, name="spatial joins"
+)
+
+
+class PolygonIndex:
+    """STRtree over a polygon layer answering batch point-in-polygon queries."""
+
+    def __init__(self, layer: gpd.GeoDataFrame, snap_layer=None):
+        self.layer = layer
+        self.tree = layer.sindex
+        self.geometries = layer.geometry.values
+        # Prepared polygons answer contains_xy from an internal edge index
+        shapely.prepare(self.geometries)
+
+        # Snapping only needs approximate borders, a simplified copy is much cheaper
+        self.snap_tree = (layer if snap_layer is None else snap_layer).sindex
+        minx, miny, maxx, maxy = layer.total_bounds
+        self.snap_distance = NEAREST_SNAP_FRACTION * max(maxx - minx, maxy - miny)
+
+    def lookup(self, lon, lat, crs="EPSG:4326"):
+        """Returns the row position of the polygon containing each point, -1 if none.
+
+        Points are deduplicated first, so repeated station coordinates cost a
+        single test each. Points just outside every polygon (border slivers,
+        rounded coordinates) snap to the nearest polygon within a short distance.
+        """
+        coords = np.column_stack(
+            [np.asarray(lon, "float64"), np.asarray(lat, "float64")]
+        )
+        valid = ~np.isnan(coords).any(axis=1)
+        # Hashing (lon, lat) as one complex number is much faster than a row-wise unique
+        inverse, unique = pd.factorize(coords[valid, 0] + 1j * coords[valid, 1])
+
+        points = gpd.GeoSeries(
+            gpd.points_from_xy(unique.real, unique.imag), crs=crs
+        ).to_crs(self.layer.crs)
+        x, y = points.x.to_numpy(), points.y.to_numpy()
+
+        # Bounding-box candidates from the tree, then an exact test per polygon
+        point_idx, polygon_idx = self.tree.query(points.values)
+        inside = np.zeros(len(point_idx), dtype=bool)
+        for polygon in np.unique(polygon_idx):
+            selected = polygon_idx == polygon
+            candidates = point_idx[selected]
+            inside[selected] = shapely.contains_xy(
+                self.geometries[polygon], x[candidates], y[candidates]
+            )
+        found = np.full(len(unique), -1)
+        found[point_idx[inside]] = polygon_idx[inside]
+
+        outside = np.flatnonzero(found < 0)
+        if len(outside):
+            # The nearest polygon within the snap distance, not just any of them
+            point_idx, polygon_idx = self.snap_tree.nearest(
+                points.values[outside],
+                return_all=False,
+                max_distance=self.snap_distance,
+            )
+            found[outside[point_idx]] = polygon_idx
+
+        result = np.full(len(coords), -1)
+        result[valid] = found[inverse]
+        return result
+
+
+def admin_source(level):
+    """Returns the (layer name, mtime) an admin level is looked up in, None if no layer exists."""
+    for name in ADMIN_LAYERS[level]:
+        path = SHAPEFILE_PATHS[name]
+        if os.path.exists(path):
+            return name, source_mtime(path)
+    return None
+
+
+def admin_sources():
+    """Returns the (layer name, mtime) of every admin level, what a join's output depends on."""
+    return [admin_source(level) for level in ADMIN_LAYERS]
+
+
+def admin_levels():
+    """Returns the admin levels that have a boundary layer in this checkout."""
+    return [level for level in ADMIN_LAYERS if admin_source(level) is not None]
+
+
+def admin_index(level):
+    """Returns the shared index for an admin level, rebuilt when its layer changes."""
+    key = admin_source(level)
+    if key is None:
+        return None
+    index = index_cache.get(key)
+    if index is None:
+        with _index_lock:
+            index = index_cache.get(key)
+            if index is None:
+                name = key[0]
+                snap_layer = level_of_detail(name, LOD_PIXELS[-1])
+                index = PolygonIndex(load_dataset(name), snap_layer)
+                size = estimate_size(index.layer) + estimate_size(snap_layer)
+                index_cache.put(key, index, size=size)
+    return index
+
+
+def attach_admin_ids(df: pd.DataFrame, lat_col="LAT", lon_col="LON"):
+    """Adds province and district attributes of the polygon containing each row."""
+    key = (
+        fingerprint(df),
+        lat_col,
+        lon_col,
+        tuple(admin_sources()),
+    )
+    joined = join_cache.get(key)
+    if joined is not None:
+        return joined
+
+    columns = {}
+    for level in ADMIN_LAYERS:
+        index = admin_index(level)
+        if index is None:
+            continue
+        positions = index.lookup(df[lon_col], df[lat_col])
+        for attribute, column in ADMIN_ATTRIBUTES[level].items():
+            if attribute not in index.layer.columns:
+                continue
+            values = index.layer[attribute].to_numpy()
+            column_values = pd.Series(values[positions], index=df.index)
+            columns[column] = column_values.where(positions >= 0).astype("category")
+
+    joined = df.assign(**columns)
+    join_cache.put(key, joined)
+    return joined
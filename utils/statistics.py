@@ -0,0 +1,230 @@
+import os
+import copy
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache, fingerprint, frame_digest
+from utils.profiling import timed
+
+# Rows kept per dataset for quantile estimates, quantiles are exact below this size
+QUANTILE_SAMPLE_SIZE = 32_768
+STATS_CACHE_MAX_BYTES = int(os.environ.get("STATS_CACHE_MAX_MB", 32)) * 1024 * 1024
+
+stats_cache = LRUCache(STATS_CACHE_MAX_BYTES, name="statistics")
+
+
+class DatasetStatistics:
+    """Mergeable per-column summaries and correlation sums, updated chunk by chunk."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = df.columns.tolist()
+        self.dtypes = df.dtypes.astype(str).tolist()
+        self.numeric = df.select_dtypes(
+            include="number", exclude="bool"
+        ).columns.tolist()
+        self.datetimes = df.select_dtypes(include="datetime").columns.tolist()
+        self.others = [
+            col for col in self.columns if col not in self.numeric + self.datetimes
+        ]
+        self.digest = None
+        self.rows = 0
+
+        k = len(self.numeric) + len(self.datetimes)
+        self.count = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.sample = np.empty((0, k))
+        self.value_counts = {col: pd.Series(dtype="int64") for col in self.others}
+
+        # Pairwise-complete sums over numeric columns, shifted for numerical stability
+        p = len(self.numeric)
+        self.shift = None
+        self.pair_n = np.zeros((p, p))
+        self.pair_sx = np.zeros((p, p))
+        self.pair_sxx = np.zeros((p, p))
+        self.pair_sxy = np.zeros((p, p))
+
+        self._rng = np.random.default_rng(0)
+        self.update(df)
+
+    def _values(self, df: pd.DataFrame):
+        # Numeric and datetime columns as one float matrix, datetimes in nanoseconds
+        columns = [
+            df[col].to_numpy(dtype="float64", na_value=np.nan) for col in self.numeric
+        ]
+        for col in self.datetimes:
+            values = (
+                df[col].to_numpy(dtype="datetime64[ns]").view("int64").astype("float64")
+            )
+            values[df[col].isna().to_numpy()] = np.nan
+            columns.append(values)
+        if not columns:
+            return np.empty((len(df), 0))
+        return np.column_stack(columns)
+
+    def update(self, chunk: pd.DataFrame):
+        """Folds appended rows into the summaries."""
+        if chunk.empty:
+            return self
+
+        values = self._values(chunk)
+        mask = ~np.isnan(values)
+
+        # Chan et al. parallel update of count, mean and sum of squared deviations
+        n_b = mask.sum(axis=0)
+        filled = np.where(mask, values, 0.0)
+        mean_b = np.divide(
+            filled.sum(axis=0), n_b, out=np.zeros(len(n_b)), where=n_b > 0
+        )
+        m2_b = (np.where(mask, values - mean_b, 0.0) ** 2).sum(axis=0)
+        total = self.count + n_b
+        delta = mean_b - self.mean
+        ratio = np.divide(n_b, total, out=np.zeros(len(n_b)), where=total > 0)
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + m2_b + delta**2 * self.count * ratio
+        self.count = total
+        self.min = np.minimum(self.min, np.where(mask, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(mask, values, -np.inf).max(axis=0))
+
+        self._update_sample(values)
+        self._update_pairs(values[:, : len(self.numeric)], mask[:, : len(self.numeric)])
+
+        for col in self.others:
+            self.value_counts[col] = self.value_counts[col].add(
+                chunk[col].value_counts(), fill_value=0
+            )
+
+        self.rows += len(chunk)
+        return self
+
+    def _update_sample(self, values):
+        # Reservoir sampling (Algorithm R), vectorized: later rows win shared slots
+        fill = min(max(QUANTILE_SAMPLE_SIZE - len(self.sample), 0), len(values))
+        if fill:
+            self.sample = np.vstack([self.sample, values[:fill]])
+        rest = values[fill:]
+        if len(rest):
+            seen = self.rows + fill + np.arange(len(rest))
+            slots = self._rng.integers(0, seen + 1)
+            keep = slots < QUANTILE_SAMPLE_SIZE
+            self.sample[slots[keep]] = rest[keep]
+
+    def _update_pairs(self, values, mask):
+        if self.shift is None:
+            self.shift = (
+                np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else 0.0
+            )
+        present = mask.astype("float64")
+        x = np.where(mask, values - self.shift, 0.0)
+        self.pair_n += present.T @ present
+        self.pair_sx += x.T @ present
+        self.pair_sxx += (x * x).T @ present
+        self.pair_sxy += x.T @ x
+
+    def corr(self):
+        """Returns the pairwise-complete Pearson correlation matrix of numeric columns."""
+        n, sx = self.pair_n, self.pair_sx
+        cov = n * self.pair_sxy - sx * sx.T
+        var = n * self.pair_sxx - sx**2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.sqrt(var * var.T)
+        corr[(n < 2) | (var <= 0) | (var.T <= 0)] = np.nan
+        return pd.DataFrame(
+            np.clip(corr, -1, 1), index=self.numeric, columns=self.numeric
+        )
+
+    def describe(self):
+        """Returns the equivalent of df.describe(include="all").transpose()."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2 / (self.count - 1))
+        quantiles = (
+            np.nanquantile(self.sample, [0.25, 0.5, 0.75], axis=0)
+            if len(self.sample)
+            else np.full((3, len(self.count)), np.nan)
+        )
+
+        rows = {}
+        for i, col in enumerate(self.numeric + self.datetimes):
+            has_values = self.count[i] > 0
+            stats = {
+                "count": self.count[i],
+                "mean": self.mean[i] if has_values else np.nan,
+                "std": std[i] if col in self.numeric else np.nan,
+                "min": self.min[i] if has_values else np.nan,
+                "25%": quantiles[0, i],
+                "50%": quantiles[1, i],
+                "75%": quantiles[2, i],
+                "max": self.max[i] if has_values else np.nan,
+            }
+            if col in self.datetimes:
+                stats = {
+                    key: (
+                        value
+                        if key in ("count", "std") or np.isnan(value)
+                        else pd.Timestamp(int(value))
+                    )
+                    for key, value in stats.items()
+                }
+            rows[col] = stats
+
+        for col in self.others:
+            counts = self.value_counts[col]
+            counts = counts[counts > 0]
+            rows[col] = {
+                "count": counts.sum(),
+                "unique": len(counts),
+                "top": counts.idxmax() if len(counts) else np.nan,
+                "freq": counts.max() if len(counts) else np.nan,
+            }
+
+        order = ["count", "unique", "top", "freq", "mean", "std", "min"]
+        order += ["25%", "50%", "75%", "max"]
+        result = pd.DataFrame.from_dict(rows, orient="index").reindex(
+            index=self.columns, columns=order
+        )
+        return result.dropna(axis=1, how="all")
+
+    @property
+    def nbytes(self):
+        size = self.sample.nbytes + 4 * self.pair_n.nbytes
+        return size + sum(
+            int(counts.memory_usage(deep=True)) for counts in self.value_counts.values()
+        )
+
+
+@timed
+def dataset_statistics(df: pd.DataFrame):
+    """Returns statistics for a frame, computed once per content version.
+
+    If a cached version of the frame is a prefix of this one, only the
+    appended rows are folded in.
+    """
+    key = fingerprint(df)
+    stats = stats_cache.get(key)
+    if stats is not None:
+        return stats
+
+    columns, dtypes = df.columns.tolist(), df.dtypes.astype(str).tolist()
+    row_hashes = None
+    for candidate in reversed(stats_cache.values()):
+        if (
+            candidate.columns != columns
+            or candidate.dtypes != dtypes
+            or candidate.rows >= len(df)
+        ):
+            continue
+        if row_hashes is None:
+            row_hashes = pd.util.hash_pandas_object(df, index=True).values
+        prefix = df.iloc[: candidate.rows]
+        if frame_digest(prefix, row_hashes[: candidate.rows]) == candidate.digest:
+            stats = copy.deepcopy(candidate).update(df.iloc[candidate.rows :])
+            break
+
+    if stats is None:
+        stats = DatasetStatistics(df)
+    stats.digest = key
+    stats_cache.put(key, stats, size=stats.nbytes)
+    return stats
@@ -0,0 +1,124 @@
+from contextlib import closing
+
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, r2_score, root_mean_squared_error
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeRegressor
+
+from utils.cache import fingerprint
+from utils.forecasting import backtest, forecast
+from utils.model_search import best_model, run_search, search_candidates
+from utils.models import model_registry
+
+SINGLE_MODELS = {
+    "Linear Regression": lambda: LinearRegression(),
+    "Decision Tree": lambda: DecisionTreeRegressor(random_state=42),
+}
+
+
+def split_dataset(df, x_columns, y_column, test_size, keep_time_order):
+    """Splits features and target, chronologically if the frame has a DATE column."""
+    if keep_time_order and "DATE" in df.columns:
+        df = df.sort_values("DATE", kind="stable")
+    return train_test_split(
+        df[x_columns],
+        df[y_column],
+        test_size=test_size,
+        shuffle=not keep_time_order,
+        random_state=None if keep_time_order else 42,
+    )
+
+
+def _registered(df, params, model_name, model, X_test, y_test):
+    # Evaluates the fitted model and stores it as a new registry version
+    y_pred = model.predict(X_test)
+    metrics = {
+        "r2": r2_score(y_test, y_pred),
+        "rmse": root_mean_squared_error(y_test, y_pred),
+        "mae": mean_absolute_error(y_test, y_pred),
+    }
+    model_id = model_registry.save(
+        model,
+        model_name,
+        params["x_columns"],
+        df[params["x_columns"]].dtypes.to_dict(),
+        params["y_column"],
+        fingerprint(df),
+        metrics,
+    )
+    return {
+        "model_id": model_id,
+        "model_name": model_name,
+        "metrics": metrics,
+        "y_test": y_test,
+        "y_pred": y_pred,
+    }
+
+
+def train_single(df, params, report):
+    """Job: fits one model on the train split."""
+    report(0.1, "Splitting data")
+    X_train, X_test, y_train, y_test = split_dataset(
+        df,
+        params["x_columns"],
+        params["y_column"],
+        params["test_size"],
+        params["keep_time_order"],
+    )
+    report(0.3, f"Fitting {params['model']}")
+    model = SINGLE_MODELS[params["model"]]()
+    model.fit(X_train, y_train)
+    report(0.9, "Evaluating")
+    return _registered(df, params, params["model"], model, X_test, y_test)
+
+
+def search(df, params, report):
+    """Job: cross-validated model comparison, reporting the leaderboard after each fold."""
+    X_train, X_test, y_train, y_test = split_dataset(
+        df,
+        params["x_columns"],
+        params["y_column"],
+        params["test_size"],
+        params["keep_time_order"],
+    )
+    candidates = search_candidates(
+        params["models"], params["search_mode"], params["n_iter"]
+    )
+    total = len(candidates) * params["n_splits"]
+
+    results = []
+    folds = run_search(
+        X_train, y_train, candidates, params["n_splits"], params["n_jobs"]
+    )
+    with closing(folds):
+        for result in folds:
+            results.append(result)
+            report(
+                0.95 * len(results) / total,
+                f"{len(results)} / {total} folds done",
+                partial=results,
+            )
+
+    report(0.95, "Refitting the best candidate")
+    model_name, model = best_model(results)
+    model.fit(X_train, y_train)
+    return {
+        **_registered(df, params, model_name, model, X_test, y_test),
+        "results": results,
+    }
+
+
+def forecast_districts(df, params, report):
+    """Job: rolling-origin backtest, then a forecast from all history."""
+    report(0.1, "Backtesting over rolling origins")
+    scores, predictions = backtest(
+        df, params["target"], params["model"], params["horizon"], params["n_splits"]
+    )
+    report(0.8, "Forecasting")
+    future, model = forecast(df, params["target"], params["model"], params["horizon"])
+    return {
+        "scores": scores,
+        "predictions": predictions,
+        "future": future,
+        "model": model,
+    }
@@ -0,0 +1,180 @@
+import os
+import re
+import sys
+import json
+import math
+
+import numpy as np
+import shapely
+import geopandas as gpd
+import plotly.graph_objects as go
+
+from utils.cache import LRUCache
+from utils.data_loader import SHAPEFILE_PATHS, source_mtime
+from utils.geometry import LOD_PIXELS, level_of_detail
+
+# Streamlit serves ./static at app/static when server.enableStaticServing is on,
+# so the browser fetches the layers itself and the server only sends a small figure
+MAP_STATIC_DIR = os.environ.get("MAP_STATIC_DIR", "static/geojson")
+MAP_STATIC_URL = os.environ.get("MAP_STATIC_URL", "app/static/geojson")
+# Attribute columns shown on hover, at most this many per feature
+HOVER_COLUMNS = 4
+# MapLibre renders the world 512 pixels wide at zoom 0
+TILE_PIXELS = 512
+
+figure_specs = LRUCache(int(os.environ.get("MAP_CACHE_MAX_MB", 16)) << 20, name="maps")
+
+
+def _slug(name):
+    return re.sub(r"\W+", "_", name).strip("_").lower()
+
+
+def quantize(gdf: gpd.GeoDataFrame, pixels: int):
+    """Reprojects a layer to lon/lat and snaps it to a grid no finer than one pixel.
+
+    Coordinates keep only the decimals that are visible at this width, which
+    is most of the size of the GeoJSON.
+    """
+    gdf = gdf.to_crs(4326)
+    minx, miny, maxx, maxy = gdf.total_bounds
+    tolerance = max(maxx - minx, maxy - miny, 1e-9) / pixels
+    decimals = max(0, math.ceil(-math.log10(tolerance)))
+    geometry = shapely.set_precision(gdf.geometry.values, 10.0**-decimals)
+    # Rounded again so the JSON has no float noise like 85.12000000000001
+    geometry = shapely.transform(geometry, lambda xy: np.round(xy, decimals))
+    gdf = gdf.set_geometry(geometry)
+    return gdf[~gdf.geometry.is_empty]
+
+
+def zoom_for(pixels, bounds):
+    """Returns the map zoom at which a layer spans about `pixels` pixels."""
+    minx, miny, maxx, maxy = bounds
+    extent = max(maxx - minx, maxy - miny, 1e-9)
+    return math.log2(pixels * 360 / (TILE_PIXELS * extent))
+
+
+def layer_geojson(name, pixels):
+    """Writes the quantized GeoJSON of a layer at a level of detail, once per source version.
+
+    Returns the file name, the quantized layer and its lon/lat bounds.
+    """
+    version = source_mtime(SHAPEFILE_PATHS[name])
+    file_name = f"{_slug(name)}_{pixels}px_{int(version)}.json"
+    path = os.path.join(MAP_STATIC_DIR, file_name)
+
+    gdf = quantize(level_of_detail(name, pixels), pixels)
+    if not os.path.exists(path):
+        os.makedirs(MAP_STATIC_DIR, exist_ok=True)
+        # Feature ids are row positions, matched by the hover trace
+        features = gdf[["geometry"]].reset_index(drop=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(features.to_json(drop_id=False, separators=(",", ":")))
+        os.replace(tmp, path)
+    return file_name, gdf, gdf.total_bounds
+
+
+def _hover_text(gdf: gpd.GeoDataFrame):
+    columns = [col for col in gdf.columns if col != "geometry"][:HOVER_COLUMNS]
+    return [
+        "<br>".join(f"{col}: {row[col]}" for col in columns)
+        for _, row in gdf[columns].iterrows()
+    ]
+
+
+def map_figure(name, pixels=LOD_PIXELS[1], inline=False):
+    """Returns an interactive plotly map of a layer at a level of detail.
+
+    The GeoJSON is referenced by URL and rendered client-side, unless
+    `inline` embeds it in the figure (when static serving is off).
+    Polygons hover with their attributes; lines are drawn as a map layer
+    and hover at one point per feature.
+    """
+    key = (name, pixels, inline, source_mtime(SHAPEFILE_PATHS[name]))
+    spec = figure_specs.get(key)
+    if spec is not None:
+        return go.Figure(spec)
+
+    file_name, gdf, bounds = layer_geojson(name, pixels)
+    if inline:
+        with open(os.path.join(MAP_STATIC_DIR, file_name)) as f:
+            source = json.load(f)
+    else:
+        source = f"{MAP_STATIC_URL}/{file_name}"
+    text = _hover_text(gdf)
+
+    fig = go.Figure()
+    if gdf.geom_type.isin(["Polygon", "MultiPolygon"]).all():
+        fig.add_trace(
+            go.Choroplethmap(
+                geojson=source,
+                locations=[str(i) for i in range(len(gdf))],
+                z=np.zeros(len(gdf)),
+                colorscale=[[0, "lightblue"], [1, "lightblue"]],
+                showscale=False,
+                marker_line_color="white",
+                marker_line_width=1,
+                marker_opacity=0.7,
+                hovertext=text,
+                hoverinfo="text",
+            )
+        )
+        layers = []
+    else:
+        points = gdf.geometry.representative_point()
+        fig.add_trace(
+            go.Scattermap(
+                lon=points.x,
+                lat=points.y,
+                mode="markers",
+                marker_size=4,
+                marker_color="steelblue",
+                hovertext=text,
+                hoverinfo="text",
+            )
+        )
+        kind = "line" if gdf.geom_type.str.contains("LineString").all() else "circle"
+        layers = [
+            {
+                "source": source,
+                "sourcetype": "geojson",
+                "type": kind,
+                "color": "steelblue",
+                "line": {"width": 1},
+            }
+        ]
+
+    minx, miny, maxx, maxy = bounds
+    fig.update_layout(
+        map={
+            "style": "carto-positron",
+            "center": {"lon": (minx + maxx) / 2, "lat": (miny + maxy) / 2},
+            # Opens at the coarsest detail's width, finer details are for zooming in
+            "zoom": zoom_for(LOD_PIXELS[0], bounds),
+            "layers": layers,
+        },
+        # Keeps the user's pan and zoom when the detail level changes
+        uirevision=name,
+        margin={"l": 0, "r": 0, "t": 0, "b": 0},
+        height=500,
+    )
+    spec = fig.to_plotly_json()
+    figure_specs.put(key, spec, size=len(json.dumps(spec, default=str)))
+    return fig
+
+
+def prepare_maps(names=None):
+    """Writes the GeoJSON of every level of detail for the given (default: all) layers."""
+    for name in names or SHAPEFILE_PATHS:
+        for pixels in LOD_PIXELS:
+            try:
+                file_name, gdf, _ = layer_geojson(name, pixels)
+            except Exception as e:
+                print(f"Skipping {name}: {e}", file=sys.stderr)
+                break
+            size = os.path.getsize(os.path.join(MAP_STATIC_DIR, file_name))
+            print(f"{file_name}: {len(gdf)} features, {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    prepare_maps(sys.argv[1:])
@@ -0,0 +1,79 @@
+import openpyxl
+import pandas as pd
+
+# Rows scanned from the top of a sheet to find its header row
+HEADER_SCAN_ROWS = 20
+
+
+def _open(path):
+    # Read-only mode streams rows from the sheet XML instead of building every cell
+    return openpyxl.load_workbook(path, read_only=True, data_only=True)
+
+
+def index_workbook(path):
+    """Returns each sheet's name, header row, column labels and row count.
+
+    The header is the first row with as many filled cells as the widest
+    of the top HEADER_SCAN_ROWS rows, which skips titles and notes above
+    the table. Only those top rows are read.
+    """
+    workbook = _open(path)
+    try:
+        sheets = []
+        for sheet in workbook.worksheets:
+            top = list(sheet.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True))
+            filled = [sum(value is not None for value in row) for row in top]
+            if not filled or max(filled) == 0:
+                continue
+            header_row = filled.index(max(filled))
+            labels = list(top[header_row])
+            while labels and labels[-1] is None:
+                labels.pop()
+            columns = [
+                label if label is not None else f"Unnamed: {i}"
+                for i, label in enumerate(labels)
+            ]
+            sheets.append(
+                {
+                    "sheet": sheet.title,
+                    "header_row": header_row,
+                    "columns": columns,
+                    "rows": max((sheet.max_row or 0) - header_row - 1, 0),
+                }
+            )
+        return sheets
+    finally:
+        workbook.close()
+
+
+def read_sheet(path, entry, columns=None, rows=None):
+    """Reads one indexed sheet, optionally only some columns and a range of data rows.
+
+    `rows` is a (first, last) pair of 0-based data row positions, inclusive.
+    Cells right of the last requested column are never read.
+    """
+    labels = entry["columns"]
+    columns = labels if columns is None else columns
+    positions = [labels.index(col) for col in columns]
+    first, last = rows if rows is not None else (0, None)
+    start = entry["header_row"] + 2 + first
+
+    workbook = _open(path)
+    try:
+        sheet = workbook[entry["sheet"]]
+        records = [
+            [row[i] if i < len(row) else None for i in positions]
+            for row in sheet.iter_rows(
+                min_row=start,
+                max_row=None if last is None else entry["header_row"] + 2 + last,
+                max_col=max(positions) + 1 if positions else 1,
+                values_only=True,
+            )
+        ]
+    finally:
+        workbook.close()
+
+    # Trailing blank rows are formatting, not data
+    while records and all(value is None for value in records[-1]):
+        records.pop()
+    return pd.DataFrame(records, columns=columns).infer_objects()